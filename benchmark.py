@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from fake_site import add_site_arguments, site_from_args
+from image_downloader import peak_rss_mb
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+
+BENCHMARK_SCRIPT = os.path.abspath(__file__)
+DEFAULT_BRAND_CONCURRENCY = [1, 4, 12]
+# Effectively no pacing, so the numbers measure the scraper rather than the politeness limits
+UNTHROTTLED_PROFILES = {
+    kind: {"rate": 10000.0, "min_rate": 10000.0, "max_rate": 10000.0, "burst": 10000, "target_latency": 3600.0}
+    for kind in ("pages", "images")
+}
+
+
+
+def cpu_seconds():
+    total = time.process_time()
+    if resource is not None:
+        # Include the Playwright driver and Chromium once they have exited
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        total += children.ru_utime + children.ru_stime
+    return total
+
+
+
+async def run_scraper(args):
+    # Runs inside a fresh worker process and working directory, so module state and peak RSS start clean
+    import extractors
+    import fetch_brands
+    import fetch_car_models
+    import rate_limiter
+    fetch_brands.set_base_url(args.base_url)
+    fetch_car_models.BRAND_CONCURRENCY = args.brand_concurrency
+    if args.page_concurrency:
+        fetch_car_models.PAGE_CONCURRENCY = args.page_concurrency
+    if args.generation_concurrency:
+        fetch_car_models.GENERATION_CONCURRENCY = args.generation_concurrency
+    if args.engine:
+        extractors.EXTRACTION_ENGINES.update(dict.fromkeys(extractors.EXTRACTION_ENGINES, args.engine))
+    if not args.keep_rate_limits:
+        rate_limiter.RATE_LIMITERS.profiles = UNTHROTTLED_PROFILES
+    start = time.monotonic()
+    start_cpu = cpu_seconds()
+    output = await fetch_car_models.fetch_car_models(brand_source=fetch_brands.stream_brands())
+    return {
+        "success": bool(output),
+        "wall_seconds": time.monotonic() - start,
+        "cpu_seconds": cpu_seconds() - start_cpu,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+
+def worker_command(args, brand_concurrency, base_url, result_file):
+    command = [
+        sys.executable, BENCHMARK_SCRIPT, "--worker",
+        "--base-url", base_url,
+        "--result-file", result_file,
+        "--brand-concurrency", str(brand_concurrency),
+    ]
+    if args.page_concurrency:
+        command.extend(["--page-concurrency", str(args.page_concurrency)])
+    if args.generation_concurrency:
+        command.extend(["--generation-concurrency", str(args.generation_concurrency)])
+    if args.engine:
+        command.extend(["--engine", args.engine])
+    if args.keep_rate_limits:
+        command.append("--keep-rate-limits")
+    return command
+
+
+
+async def run_benchmark(args):
+    site = site_from_args(args)
+    base_url = await site.start()
+    expected = site.expected_counts()
+    print(
+        f"Fake site at {base_url}: {args.brands} brands, {args.models} models each, "
+        f"{expected['pages']} pages and {expected['images']} images per crawl"
+    )
+    results = []
+    try:
+        for brand_concurrency in args.brand_concurrency:
+            site.reset_counters()
+            with tempfile.TemporaryDirectory(prefix="car-scraper-benchmark-") as workdir:
+                result_file = os.path.join(workdir, "benchmark_result.json")
+                output = None if args.verbose else subprocess.DEVNULL
+                process = await asyncio.create_subprocess_exec(
+                    *worker_command(args, brand_concurrency, base_url, result_file),
+                    cwd=workdir,
+                    stdout=output,
+                    stderr=output,
+                )
+                await process.wait()
+                if not os.path.exists(result_file):
+                    print(f"Run with {brand_concurrency} brand slots failed (exit code {process.returncode})")
+                    continue
+                with open(result_file, "r", encoding="utf-8") as f:
+                    result = json.load(f)
+            wall = max(result["wall_seconds"], 1e-9)
+            result.update({
+                "brand_concurrency": brand_concurrency,
+                "pages": site.pages_served,
+                "images": site.images_served,
+                "megabytes": site.bytes_served / (1024 * 1024),
+                "pages_per_second": site.pages_served / wall,
+                "images_per_second": site.images_served / wall,
+                "cpu_percent": 100 * result["cpu_seconds"] / wall,
+                "complete": site.pages_served >= expected["pages"] and site.images_served >= expected["images"],
+            })
+            results.append(result)
+    finally:
+        await site.stop()
+    return results
+
+
+
+def print_results(results):
+    print(
+        f"\n{'brands':>6} {'wall s':>8} {'pages':>6} {'pages/s':>8} {'images':>7} {'images/s':>9} "
+        f"{'MB':>7} {'peak RSS':>9} {'CPU s':>7} {'CPU %':>6}  complete"
+    )
+    for result in results:
+        peak = f"{result['peak_rss_mb']:.1f} MB" if result["peak_rss_mb"] is not None else "n/a"
+        print(
+            f"{result['brand_concurrency']:>6} {result['wall_seconds']:>8.2f} {result['pages']:>6} "
+            f"{result['pages_per_second']:>8.1f} {result['images']:>7} {result['images_per_second']:>9.1f} "
+            f"{result['megabytes']:>7.1f} {peak:>9} {result['cpu_seconds']:>7.2f} {result['cpu_percent']:>6.0f}  "
+            f"{'yes' if result['complete'] and result['success'] else 'NO'}"
+        )
+
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the scraper against a local fake autoevolution.com at several concurrency settings"
+    )
+    add_site_arguments(parser)
+    parser.add_argument(
+        "--brand-concurrency",
+        type=int,
+        nargs="+",
+        default=DEFAULT_BRAND_CONCURRENCY,
+        help="brand slot counts to compare, one crawl each",
+    )
+    parser.add_argument("--page-concurrency", type=int, help="override PAGE_CONCURRENCY for every run")
+    parser.add_argument("--generation-concurrency", type=int, help="override GENERATION_CONCURRENCY for every run")
+    parser.add_argument(
+        "--engine",
+        choices=["auto", "http", "browser"],
+        help="force one extraction engine for every stage (default: the engines configured in extractors.py)",
+    )
+    parser.add_argument(
+        "--keep-rate-limits",
+        action="store_true",
+        help="pace requests with the normal host profiles instead of running unthrottled",
+    )
+    parser.add_argument("--output", help="also write the results as JSON to this file, e.g. to compare commits")
+    parser.add_argument("--verbose", action="store_true", help="show the scraper's own output")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        args.brand_concurrency = args.brand_concurrency[0]
+        result = asyncio.run(run_scraper(args))
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return
+    results = asyncio.run(run_benchmark(args))
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
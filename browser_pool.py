@@ -0,0 +1,173 @@
+import asyncio
+import contextlib
+import time
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from metrics import METRICS
+from rate_limiter import limiter_for
+
+
+
+NAVIGATION_TIMEOUT = 60000
+SELECTOR_TIMEOUT = 15000
+JS_HEAP_SCRIPT = "() => performance.memory ? performance.memory.usedJSHeapSize : null"
+
+
+
+async def goto_and_wait_for(page, url, selector, timeout=NAVIGATION_TIMEOUT, selector_timeout=SELECTOR_TIMEOUT):
+    limiter = limiter_for(url)
+    await limiter.acquire()
+    start = time.monotonic()
+    try:
+        response = await page.goto(url, wait_until="domcontentloaded", timeout=timeout)
+    except Exception as e:
+        if isinstance(e, PlaywrightTimeoutError):
+            limiter.record(timeout=True)
+        METRICS.request("navigation", url, time.monotonic() - start, error=e)
+        raise
+    latency = time.monotonic() - start
+    if response is not None:
+        limiter.record(
+            status=response.status,
+            latency=latency,
+            retry_after=response.headers.get("retry-after"),
+        )
+    METRICS.request("navigation", url, latency, status=response.status if response is not None else None)
+    selector_start = time.monotonic()
+    try:
+        await page.wait_for_selector(selector, state="attached", timeout=selector_timeout)
+    except PlaywrightTimeoutError:
+        METRICS.increment("selector_timeouts_total", stage="navigation")
+        print(f"  No '{selector}' elements appeared on {url} within {selector_timeout / 1000:.0f}s")
+    METRICS.observe("selector_wait_seconds", time.monotonic() - selector_start, stage="navigation")
+    return response
+
+
+
+async def record_js_heap(page):
+    try:
+        used_bytes = await page.evaluate(JS_HEAP_SCRIPT)
+    except Exception:
+        return
+    if used_bytes:
+        METRICS.observe("browser_js_heap_mb", used_bytes / (1024 * 1024), stage="browser")
+
+
+
+class BrowserContextPool:
+    def __init__(self, browser=None, context_options=None, size=8, max_uses=50, limiter=None, resource_filter=None, launch_browser=None):
+        # Pass launch_browser instead of a browser to start Chromium only when the first page is needed
+        self.browser = browser
+        self.launch_browser = launch_browser
+        self.context_options = context_options or {}
+        self.size = max(1, int(size))
+        self.max_uses = max_uses
+        self.limiter = limiter
+        self.resource_filter = resource_filter
+        self.hits = 0
+        self.misses = 0
+        self.recycled = 0
+        self.reset_failures = 0
+        self.pages_opened = 0
+        self.pages_closed = 0
+        self._idle = []
+        self._open_contexts = set()
+        self._semaphore = asyncio.Semaphore(self.size)
+        self._launch_lock = asyncio.Lock()
+        self._closed = False
+
+    async def _get_browser(self):
+        async with self._launch_lock:
+            if self.browser is None:
+                self.browser = await self.launch_browser()
+        return self.browser
+
+    async def _acquire_context(self):
+        while self._idle:
+            entry = self._idle.pop()
+            if entry["context"] in self._open_contexts:
+                self.hits += 1
+                return entry
+        self.misses += 1
+        browser = await self._get_browser()
+        context = await browser.new_context(**self.context_options)
+        self._open_contexts.add(context)
+        if self.resource_filter is not None:
+            await self.resource_filter.install(context)
+        return {"context": context, "uses": 0}
+
+    async def _reset_context(self, context):
+        for stray_page in list(context.pages):
+            await stray_page.close()
+        await context.clear_cookies()
+
+    async def _close_context(self, context):
+        self._open_contexts.discard(context)
+        try:
+            await context.close()
+        except Exception as e:
+            print(f"Error closing browser context: {e}")
+
+    async def _release_context(self, entry):
+        entry["uses"] += 1
+        context = entry["context"]
+        if self._closed or entry["uses"] >= self.max_uses:
+            self.recycled += 1
+            await self._close_context(context)
+            return
+        try:
+            await self._reset_context(context)
+        except Exception as e:
+            print(f"Error resetting browser context, discarding it: {e}")
+            self.reset_failures += 1
+            await self._close_context(context)
+            return
+        self._idle.append(entry)
+
+    @contextlib.asynccontextmanager
+    async def _limited(self):
+        if self.limiter is None:
+            yield
+        else:
+            async with self.limiter.slot():
+                yield
+
+    @contextlib.asynccontextmanager
+    async def page(self):
+        async with self._limited():
+            async with self._semaphore:
+                entry = await self._acquire_context()
+                try:
+                    page = await entry["context"].new_page()
+                    self.pages_opened += 1
+                    try:
+                        yield page
+                    finally:
+                        if self.resource_filter is not None:
+                            self.resource_filter.finish_page(page)
+                        try:
+                            await page.close()
+                        except Exception as e:
+                            print(f"Error closing page: {e}")
+                        self.pages_closed += 1
+                finally:
+                    await self._release_context(entry)
+
+    async def close(self):
+        self._closed = True
+        self._idle.clear()
+        for context in list(self._open_contexts):
+            await self._close_context(context)
+        if self.launch_browser is not None and self.browser is not None:
+            await self.browser.close()
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def print_report(self):
+        print(
+            f"Context pool: size {self.size}, {self.hits} hits, {self.misses} misses "
+            f"({self.hit_ratio():.1%} hit ratio), {self.recycled} recycled, "
+            f"{self.reset_failures} reset failures, {self.pages_opened} pages opened, "
+            f"{self.pages_closed} pages closed"
+        )
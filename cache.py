@@ -0,0 +1,128 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+
+
+CACHE_PATH = "http_cache.sqlite3"
+CACHE_MAX_AGE = 3600  # Seconds an entry is trusted without revalidating it with the server
+
+
+
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+
+class HttpCache:
+    def __init__(self, path=CACHE_PATH, max_age=CACHE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.stats = {}
+        # Sharded workers share the cache file, so wait for each other's writes instead of failing
+        self._connection = sqlite3.connect(path, isolation_level=None, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                payload TEXT,
+                checked_at REAL NOT NULL
+            )
+        """)
+
+    def get(self, url):
+        row = self._connection.execute(
+            "SELECT etag, last_modified, content_hash, payload, checked_at FROM entries WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, stored_hash, payload, checked_at = row
+        return {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_hash": stored_hash,
+            "payload": json.loads(payload) if payload is not None else None,
+            "checked_at": checked_at,
+        }
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry["checked_at"] < self.max_age
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry is None:
+            return headers
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url, response_headers, stored_hash, payload=None):
+        self._connection.execute(
+            """
+            INSERT INTO entries (url, etag, last_modified, content_hash, payload, checked_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                content_hash = excluded.content_hash,
+                payload = excluded.payload,
+                checked_at = excluded.checked_at
+            """,
+            (
+                url,
+                response_headers.get("ETag"),
+                response_headers.get("Last-Modified"),
+                stored_hash,
+                json.dumps(payload, ensure_ascii=False) if payload is not None else None,
+                time.time(),
+            ),
+        )
+
+    def set_payload(self, url, payload):
+        self._connection.execute(
+            "UPDATE entries SET payload = ? WHERE url = ?",
+            (json.dumps(payload, ensure_ascii=False), url),
+        )
+
+    def touch(self, url, response_headers=None):
+        if response_headers and (response_headers.get("ETag") or response_headers.get("Last-Modified")):
+            self._connection.execute(
+                """
+                UPDATE entries SET
+                    etag = COALESCE(?, etag),
+                    last_modified = COALESCE(?, last_modified),
+                    checked_at = ?
+                WHERE url = ?
+                """,
+                (response_headers.get("ETag"), response_headers.get("Last-Modified"), time.time(), url),
+            )
+        else:
+            self._connection.execute("UPDATE entries SET checked_at = ? WHERE url = ?", (time.time(), url))
+
+    def delete(self, url):
+        self._connection.execute("DELETE FROM entries WHERE url = ?", (url,))
+
+    def record(self, kind, outcome):
+        counts = self.stats.setdefault(kind, {"hit": 0, "revalidated": 0, "miss": 0})
+        counts[outcome] += 1
+
+    def close(self):
+        self._connection.close()
+
+    def print_report(self):
+        for kind, counts in sorted(self.stats.items()):
+            print(
+                f"Cache ({kind}s): {counts['hit']} hits, {counts['revalidated']} revalidated, "
+                f"{counts['miss']} misses"
+            )
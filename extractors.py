@@ -0,0 +1,518 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+import aiohttp
+from cache import content_hash
+from metrics import METRICS
+from rate_limiter import limiter_for
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+
+
+# Extraction engine per stage: "browser" renders with Playwright, "http" parses the
+# static HTML fetched with aiohttp, "auto" tries "http" and falls back to "browser"
+# when the static result looks empty or incomplete.
+EXTRACTION_ENGINES = {
+    "brands": "auto",
+    "models": "auto",
+    "generations": "auto",
+}
+HTML_PARSER = "html.parser"
+HTTP_TIMEOUT = 60
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+ENGINE_STATS = {
+    "http": 0,
+    "browser": 0,
+    "fallbacks": 0,
+    "cached": 0,
+}
+
+
+
+BRAND_COUNT_SCRIPT = """
+    () => {
+        const element = document.querySelector('.carbrnum b');
+        return element ? parseInt(element.textContent.trim()) : null;
+    }
+"""
+BRANDS_SCRIPT = """
+    () => {
+        const brandItems = [];
+        document.querySelectorAll('.carman').forEach(brandElement => {
+            const h5Element = brandElement.querySelector('h5 a span');
+            if (!h5Element) return;
+            const brandName = h5Element.textContent.trim();
+            if (brandName.length <= 1) return;
+            const urlElement = brandElement.querySelector('h5 a');
+            const url = urlElement ? urlElement.getAttribute('href') : null;
+            const statsElement = brandElement.nextElementSibling;
+            let inProduction = 0;
+            let discontinued = 0;
+            if (statsElement && statsElement.classList.contains('carnums')) {
+                const statsTexts = statsElement.querySelectorAll('p b');
+                if (statsTexts.length >= 2) {
+                    inProduction = parseInt(statsTexts[0].textContent.trim()) || 0;
+                    discontinued = parseInt(statsTexts[1].textContent.trim()) || 0;
+                }
+            }
+              brandItems.push({
+                name: brandName,
+                name_normalized: brandName.toUpperCase(),
+                url: url,
+                in_production: inProduction,
+                discontinued: discontinued,
+                total_models: inProduction + discontinued
+            });
+        });
+        return brandItems;
+    }
+"""
+MODELS_SCRIPT = """
+    () => {
+        const carModels = [];
+        document.querySelectorAll('a[title*="specs and photos"]').forEach(nameElement => {
+            const modelName = nameElement.getAttribute('title').replace(' specs and photos', '').trim();
+            const modelUrl = nameElement.getAttribute('href');
+            let imageUrl = null;
+            const imgElement = nameElement.querySelector('img') || 
+                              (nameElement.parentElement ? nameElement.parentElement.querySelector('img') : null);
+            if (imgElement) {
+                imageUrl = imgElement.getAttribute('src');
+                if (!imageUrl || imageUrl.includes('blank.gif')) {
+                    imageUrl = imgElement.getAttribute('data-src') || null;
+                }
+            }
+            let productionYears = null;
+            const parentElement = nameElement.closest('.container2') || nameElement.parentElement;
+            const yearElement = parentElement ? parentElement.querySelector('.years, .semra') : null;
+            if (yearElement) {
+                productionYears = yearElement.textContent.trim();
+            }
+            carModels.push({
+                name: modelName,
+                url: modelUrl,
+                image_url: imageUrl,
+                production_years: productionYears
+            });
+        });
+        return carModels;
+    }
+"""
+GENERATIONS_SCRIPT = r"""
+    () => {
+        const generations = [];
+        const generationContainers = document.querySelectorAll('.carseries.clearfix');
+        generationContainers.forEach((container, index) => {
+            const linkElement = container.querySelector('a.dispblock[href]');
+            if (!linkElement) {
+                return;
+            }
+            const generationUrl = linkElement.getAttribute('href');
+            let generationName = null;
+            let productionYears = null;
+            const h2Element = linkElement.querySelector('h2');
+            if (h2Element) {
+                let fullText = h2Element.textContent.trim();
+                const spanElement = h2Element.querySelector('span.col-red');
+                if (spanElement) {
+                    generationName = spanElement.textContent.trim();
+                    const yearsElement = linkElement.querySelector('.years.faded.fsz16') || 
+                                       linkElement.querySelector('.years.faded') ||
+                                       linkElement.querySelector('.years') ||
+                                       linkElement.querySelector('[class*="years"]');
+                    if (yearsElement) {
+                        productionYears = yearsElement.textContent.trim();
+                        productionYears = productionYears.replace(/^\(Production years:\s*/i, '').replace(/^\(/, '').replace(/\)$/, '').trim();
+                    } else {
+                        const spanText = spanElement.textContent.trim();
+                        const textAfterSpan = fullText.replace(spanText, '').trim();
+                        const match = textAfterSpan.match(/^\(([^)]+)\)/);
+                        if (match) {
+                            productionYears = match[1].trim();
+                        }
+                    }
+                } else {
+                    const match = fullText.match(/^(.+?)\s*\(([^)]+)\).*$/);
+                    if (match) {
+                        generationName = match[1].trim();
+                        productionYears = match[2].trim();
+                    } else {
+                        generationName = fullText;
+                    }
+                }
+            }
+            let imageUrl = null;
+            const imgElement = linkElement.querySelector('picture img');
+            if (imgElement) {
+                imageUrl = imgElement.getAttribute('src');
+                if (!imageUrl || imageUrl.includes('blank.gif')) {
+                    imageUrl = imgElement.getAttribute('data-src') || null;
+                }
+                if (!imageUrl) {
+                    const sourceElement = linkElement.querySelector('picture source[srcset]');
+                    if (sourceElement) {
+                        const srcset = sourceElement.getAttribute('srcset');
+                        if (srcset) {
+                            imageUrl = srcset.split(' ')[0]; // Take first URL from srcset
+                        }
+                    }
+                }
+            }
+            if (generationUrl && generationName) {
+                generations.push({
+                    name: generationName,
+                    production_years: productionYears,
+                    url: generationUrl,
+                    image_url: imageUrl
+                });
+            }
+        });
+        return generations;
+    }
+"""
+
+
+
+def _text(element):
+    return element.get_text().strip()
+
+
+
+def _parse_int(text):
+    match = re.match(r"\s*([+-]?\d+)", text)
+    return int(match.group(1)) if match else None
+
+
+
+def _image_url(img_element):
+    image_url = img_element.get("src")
+    if not image_url or "blank.gif" in image_url:
+        image_url = img_element.get("data-src") or None
+    return image_url
+
+
+
+def parse_brand_count(html):
+    soup = BeautifulSoup(html, HTML_PARSER)
+    element = soup.select_one(".carbrnum b")
+    return _parse_int(_text(element)) if element else None
+
+
+
+def parse_brands(html):
+    soup = BeautifulSoup(html, HTML_PARSER)
+    brand_items = []
+    for brand_element in soup.select(".carman"):
+        h5_element = brand_element.select_one("h5 a span")
+        if not h5_element:
+            continue
+        brand_name = _text(h5_element)
+        if len(brand_name) <= 1:
+            continue
+        url_element = brand_element.select_one("h5 a")
+        url = url_element.get("href") if url_element else None
+        stats_element = brand_element.find_next_sibling()
+        in_production = 0
+        discontinued = 0
+        if stats_element and "carnums" in (stats_element.get("class") or []):
+            stats_texts = stats_element.select("p b")
+            if len(stats_texts) >= 2:
+                in_production = _parse_int(_text(stats_texts[0])) or 0
+                discontinued = _parse_int(_text(stats_texts[1])) or 0
+        brand_items.append({
+            "name": brand_name,
+            "name_normalized": brand_name.upper(),
+            "url": url,
+            "in_production": in_production,
+            "discontinued": discontinued,
+            "total_models": in_production + discontinued
+        })
+    return brand_items
+
+
+
+def parse_car_models(html):
+    soup = BeautifulSoup(html, HTML_PARSER)
+    car_models = []
+    for name_element in soup.select('a[title*="specs and photos"]'):
+        model_name = name_element.get("title").replace(" specs and photos", "", 1).strip()
+        model_url = name_element.get("href")
+        image_url = None
+        img_element = name_element.select_one("img")
+        if img_element is None and name_element.parent is not None:
+            img_element = name_element.parent.select_one("img")
+        if img_element:
+            image_url = _image_url(img_element)
+        production_years = None
+        if "container2" in (name_element.get("class") or []):
+            parent_element = name_element
+        else:
+            parent_element = name_element.find_parent(class_="container2") or name_element.parent
+        year_element = parent_element.select_one(".years, .semra") if parent_element else None
+        if year_element:
+            production_years = _text(year_element)
+        car_models.append({
+            "name": model_name,
+            "url": model_url,
+            "image_url": image_url,
+            "production_years": production_years
+        })
+    return car_models
+
+
+
+def parse_generations(html):
+    soup = BeautifulSoup(html, HTML_PARSER)
+    generations = []
+    for container in soup.select(".carseries.clearfix"):
+        link_element = container.select_one("a.dispblock[href]")
+        if not link_element:
+            continue
+        generation_url = link_element.get("href")
+        generation_name = None
+        production_years = None
+        h2_element = link_element.select_one("h2")
+        if h2_element:
+            full_text = _text(h2_element)
+            span_element = h2_element.select_one("span.col-red")
+            if span_element:
+                generation_name = _text(span_element)
+                years_element = (
+                    link_element.select_one(".years.faded.fsz16")
+                    or link_element.select_one(".years.faded")
+                    or link_element.select_one(".years")
+                    or link_element.select_one('[class*="years"]')
+                )
+                if years_element:
+                    production_years = _text(years_element)
+                    production_years = re.sub(r"^\(Production years:\s*", "", production_years, count=1, flags=re.IGNORECASE)
+                    production_years = re.sub(r"^\(", "", production_years, count=1)
+                    production_years = re.sub(r"\)$", "", production_years, count=1).strip()
+                else:
+                    text_after_span = full_text.replace(_text(span_element), "", 1).strip()
+                    match = re.match(r"\(([^)]+)\)", text_after_span)
+                    if match:
+                        production_years = match.group(1).strip()
+            else:
+                match = re.match(r"(.+?)\s*\(([^)]+)\).*$", full_text)
+                if match:
+                    generation_name = match.group(1).strip()
+                    production_years = match.group(2).strip()
+                else:
+                    generation_name = full_text
+        image_url = None
+        img_element = link_element.select_one("picture img")
+        if img_element:
+            image_url = _image_url(img_element)
+            if not image_url:
+                source_element = link_element.select_one("picture source[srcset]")
+                if source_element:
+                    srcset = source_element.get("srcset")
+                    if srcset:
+                        image_url = srcset.split(" ")[0]
+        if generation_url and generation_name:
+            generations.append({
+                "name": generation_name,
+                "production_years": production_years,
+                "url": generation_url,
+                "image_url": image_url
+            })
+    return generations
+
+
+
+def http_engine_available():
+    return BeautifulSoup is not None
+
+
+
+def engine_for(stage):
+    engine = EXTRACTION_ENGINES.get(stage, "browser")
+    if engine not in ("browser", "http", "auto"):
+        raise ValueError(f"Unknown extraction engine '{engine}' for stage '{stage}'")
+    if engine == "http" and not http_engine_available():
+        raise RuntimeError("The http extraction engine requires beautifulsoup4 (pip install beautifulsoup4)")
+    if engine == "auto" and not http_engine_available():
+        return "browser"
+    return engine
+
+
+
+class PageFetcher:
+    def __init__(self, session, cache=None):
+        self.session = session
+        self.cache = cache
+
+    async def fetch(self, url, user_agent=None):
+        entry = self.cache.get(url) if self.cache is not None else None
+        if entry is not None and entry["payload"] is None:
+            entry = None
+        if entry is not None and self.cache.is_fresh(entry):
+            self.cache.record("page", "hit")
+            return None, entry["payload"]
+        headers = {"User-Agent": user_agent} if user_agent else {}
+        if entry is not None:
+            headers.update(self.cache.conditional_headers(entry))
+        limiter = limiter_for(url)
+        await limiter.acquire()
+        start = time.monotonic()
+        try:
+            async with self.session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)) as response:
+                limiter.record(
+                    status=response.status,
+                    latency=time.monotonic() - start,
+                    retry_after=response.headers.get("Retry-After"),
+                )
+                if response.status == 304 and entry is not None:
+                    METRICS.request("http", url, time.monotonic() - start, status=response.status)
+                    self.cache.touch(url, response.headers)
+                    self.cache.record("page", "revalidated")
+                    return None, entry["payload"]
+                if response.status != 200:
+                    METRICS.request("http", url, time.monotonic() - start, status=response.status)
+                    print(f"  Static fetch of {url} returned status {response.status}")
+                    return None, None
+                html = await response.text()
+                response_headers = response.headers
+                METRICS.request("http", url, time.monotonic() - start, status=response.status, size=response.content.total_bytes)
+        except asyncio.TimeoutError as e:
+            limiter.record(timeout=True)
+            METRICS.request("http", url, time.monotonic() - start, error=e)
+            print(f"  Static fetch of {url} timed out")
+            return None, None
+        except Exception as e:
+            METRICS.request("http", url, time.monotonic() - start, error=e)
+            print(f"  Static fetch of {url} failed: {e}")
+            return None, None
+        if self.cache is not None:
+            digest = content_hash(html)
+            if entry is not None and entry["content_hash"] == digest:
+                self.cache.touch(url, response_headers)
+                self.cache.record("page", "revalidated")
+                return None, entry["payload"]
+            self.cache.put(url, response_headers, digest)
+            self.cache.record("page", "miss")
+        return html, None
+
+    def store(self, url, records):
+        if self.cache is not None:
+            self.cache.set_payload(url, records)
+
+
+
+async def extract_with_engine(stage, url, parse_html, extract_with_browser, fetcher, user_agent=None, is_complete=bool):
+    engine = engine_for(stage)
+    html = None
+    if engine != "browser":
+        html, cached_records = await fetcher.fetch(url, user_agent)
+        if cached_records is not None:
+            ENGINE_STATS["cached"] += 1
+            return cached_records
+        records = parse_html(html) if html is not None else None
+        if engine == "http":
+            ENGINE_STATS["http"] += 1
+            if records is None:
+                # Same as a failed navigation, so the caller's error and frontier-failure paths apply
+                raise RuntimeError(f"Static fetch of {url} failed")
+            fetcher.store(url, records)
+            return records
+        if records is not None and is_complete(records):
+            ENGINE_STATS["http"] += 1
+            fetcher.store(url, records)
+            return records
+        ENGINE_STATS["fallbacks"] += 1
+        METRICS.increment("engine_fallbacks_total", stage=stage)
+        print(f"  Static {stage} extraction looked incomplete for {url}, falling back to browser")
+    ENGINE_STATS["browser"] += 1
+    records = await extract_with_browser()
+    # Rendered records are cached against the static HTML hash, so an unchanged page skips the browser next time
+    if html is not None and records and is_complete(records):
+        fetcher.store(url, records)
+    return records
+
+
+
+def print_engine_report():
+    print(
+        f"Extraction engines: {ENGINE_STATS['http']} pages parsed from static HTML, "
+        f"{ENGINE_STATS['browser']} rendered in the browser ({ENGINE_STATS['fallbacks']} fallbacks), "
+        f"{ENGINE_STATS['cached']} served from cache"
+    )
+
+
+
+FIXTURES = [
+    ("brands.html", BRANDS_SCRIPT, parse_brands),
+    ("brand_models.html", MODELS_SCRIPT, parse_car_models),
+    ("model_generations.html", GENERATIONS_SCRIPT, parse_generations),
+]
+
+
+
+def golden_path(filename, fixtures_dir=FIXTURES_DIR):
+    # The browser engine's records for a fixture, which the static parsers are tested against
+    return os.path.join(fixtures_dir, os.path.splitext(filename)[0] + ".expected.json")
+
+
+
+def load_golden(filename, fixtures_dir=FIXTURES_DIR):
+    with open(golden_path(filename, fixtures_dir), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+
+async def compare_engines(fixtures_dir=FIXTURES_DIR, update_goldens=False):
+    from playwright.async_api import async_playwright
+    playwright = await async_playwright().start()
+    browser = await playwright.chromium.launch(headless=True)
+    mismatches = 0
+    try:
+        page = await browser.new_page()
+        for filename, script, parse_html in FIXTURES:
+            with open(os.path.join(fixtures_dir, filename), "r", encoding="utf-8") as f:
+                html = f.read()
+            await page.set_content(html)
+            browser_records = await page.evaluate(script)
+            if update_goldens:
+                with open(golden_path(filename, fixtures_dir), "w", encoding="utf-8") as f:
+                    json.dump(browser_records, f, indent=2, ensure_ascii=False)
+                    f.write("\n")
+                print(f"{filename}: wrote {len(browser_records)} browser records to {golden_path(filename, fixtures_dir)}")
+            expected = load_golden(filename, fixtures_dir)
+            http_records = parse_html(html)
+            if browser_records == expected and http_records == expected:
+                print(f"{filename}: {len(http_records)} records, both engines match the expected records")
+                continue
+            mismatches += 1
+            print(f"{filename}: engines differ from the expected records")
+            for engine, records in (("browser", browser_records), ("http", http_records)):
+                if records != expected:
+                    print(f"  {engine}: {json.dumps(records, indent=2, ensure_ascii=False)}")
+            print(f"  expected: {json.dumps(expected, indent=2, ensure_ascii=False)}")
+    finally:
+        await browser.close()
+        await playwright.stop()
+    return mismatches == 0
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check both extraction engines against the expected records for the saved fixture pages"
+    )
+    parser.add_argument("fixtures_dir", nargs="?", default=FIXTURES_DIR)
+    parser.add_argument(
+        "--update-goldens",
+        action="store_true",
+        help="rewrite fixtures/*.expected.json from what Chromium extracts, e.g. after a script or fixture change",
+    )
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(compare_engines(args.fixtures_dir, args.update_goldens)) else 1)
@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import io
+import random
+from html import escape
+from aiohttp import web
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+
+FAKE_BRANDS = 40
+FAKE_MODELS_PER_BRAND = 12
+FAKE_GENERATIONS = 5  # Generations listed on each multi-generation model page
+FAKE_MULTI_GENERATION_RATIO = 0.4  # Share of models that link to a generations page
+FAKE_LATENCY = 0.05  # Seconds before each response, like a real round trip
+FAKE_JITTER = 0.02
+FAKE_IMAGE_SIZE = 40 * 1024
+JPEG_HEADER = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00"
+JPEG_COMMENT_LIMIT = 65533  # Largest JPEG comment segment, used to pad real images towards --image-size
+
+
+
+# Synthetic brand, model and generation pages with the same markup as autoevolution.com. Pages and
+# images are served on separate ports so the crawler sees two hosts and paces them with separate rate
+# limiters, as it does against the real site and its CDN
+class FakeAutoevolution:
+    def __init__(
+        self,
+        brands=FAKE_BRANDS,
+        models_per_brand=FAKE_MODELS_PER_BRAND,
+        generations=FAKE_GENERATIONS,
+        multi_generation_ratio=FAKE_MULTI_GENERATION_RATIO,
+        latency=FAKE_LATENCY,
+        jitter=FAKE_JITTER,
+        image_size=FAKE_IMAGE_SIZE,
+    ):
+        self.brands = brands
+        self.models_per_brand = models_per_brand
+        self.generations = generations
+        self.multi_generation_ratio = multi_generation_ratio
+        self.latency = latency
+        self.jitter = jitter
+        self.image_size = image_size
+        self.base_url = None
+        self.image_base_url = None
+        self.pages_served = 0
+        self.images_served = 0
+        self.bytes_served = 0
+        self._runner = None
+
+    def reset_counters(self):
+        self.pages_served = 0
+        self.images_served = 0
+        self.bytes_served = 0
+
+    def expected_counts(self):
+        multi_generation_models = sum(
+            1 for brand in range(self.brands) for model in range(self.models_per_brand) if self._is_multi_generation(brand, model)
+        )
+        single_models = self.brands * self.models_per_brand - multi_generation_models
+        return {
+            "pages": 1 + self.brands + multi_generation_models,
+            "images": single_models + multi_generation_models * self.generations,
+        }
+
+    def _is_multi_generation(self, brand, model):
+        # Deterministic per model so every run crawls the same site
+        return random.Random(brand * 100003 + model).random() < self.multi_generation_ratio
+
+    async def _delay(self):
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def _page(self, title, body):
+        self.pages_served += 1
+        html = (
+            '<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n'
+            f"<title>{escape(title)} | autoevolution</title>\n</head>\n<body>\n{body}\n</body>\n</html>\n"
+        )
+        self.bytes_served += len(html)
+        return web.Response(text=html, content_type="text/html")
+
+    def _brand_name(self, brand):
+        return f"BRAND {brand:04d}"
+
+    async def brands_page(self, request):
+        await self._delay()
+        items = []
+        for brand in range(self.brands):
+            name = self._brand_name(brand)
+            url = f"{self.base_url}/brand-{brand}/"
+            items.append(
+                '    <div class="col2width fl bcol-white carman">\n'
+                f'      <a href="{url}" title="{name} cars"><img src="{self.image_base_url}/images/producers/brand-{brand}-sm.jpg" alt="{name}"></a>\n'
+                f'      <h5><a href="{url}" title="{name} models"><span itemprop="name">{name}</span></a></h5>\n'
+                "    </div>\n"
+                f'    <div class="carnums"><p><b>{self.models_per_brand}</b> models in production</p></div>'
+            )
+        body = (
+            f'<div class="carbrnum">Currently listing <b>{self.brands}</b> car brands</div>\n'
+            '<div class="carlist">\n' + "\n".join(items) + "\n</div>"
+        )
+        return self._page("All car brands and models", body)
+
+    async def models_page(self, request):
+        await self._delay()
+        brand = int(request.match_info["brand"])
+        if brand >= self.brands:
+            raise web.HTTPNotFound()
+        brand_name = self._brand_name(brand)
+        items = []
+        for model in range(self.models_per_brand):
+            name = f"{brand_name} Model {model}"
+            url = f"{self.base_url}/brand-{brand}/model-{model}/"
+            if self._is_multi_generation(brand, model):
+                years = f"{self.generations} Generations<br>{1990 + model} - Present"
+            else:
+                years = f"1 Generation<br>{1990 + model} - {2000 + model}"
+            items.append(
+                '  <div class="carmod clearfix">\n    <div class="container2">\n'
+                f'      <a href="{url}" title="{name} specs and photos">\n'
+                f'        <img src="{self.image_base_url}/images/models/brand-{brand}-model-{model}.jpg" alt="{name}">\n'
+                "      </a>\n"
+                f'      <h4><a href="{url}" title="{name} specs and photos">{name}</a></h4>\n'
+                f'      <p class="years">{years}</p>\n'
+                "    </div>\n  </div>"
+            )
+        return self._page(f"{brand_name} models and specs", '<div class="carmodels">\n' + "\n".join(items) + "\n</div>")
+
+    async def generations_page(self, request):
+        await self._delay()
+        brand = int(request.match_info["brand"])
+        model = int(request.match_info["model"])
+        if brand >= self.brands or model >= self.models_per_brand:
+            raise web.HTTPNotFound()
+        model_name = f"{self._brand_name(brand)} Model {model}"
+        items = []
+        for generation in range(self.generations):
+            start_year = 1990 + model + generation * 5
+            name = f"{model_name} (G{generation})"
+            items.append(
+                '  <div class="carseries clearfix">\n'
+                f'    <a class="dispblock" href="{self.base_url}/brand-{brand}/model-{model}-g{generation}/">\n'
+                f'      <h2><span class="col-red">{name}</span> <span class="years">(Production years: {start_year} - {start_year + 5})</span></h2>\n'
+                f'      <picture><img src="{self.image_base_url}/images/models/brand-{brand}-model-{model}-g{generation}.jpg" alt="{name}"></picture>\n'
+                "    </a>\n  </div>"
+            )
+        return self._page(f"{model_name} generations", '<div class="carseries-list">\n' + "\n".join(items) + "\n</div>")
+
+    def _image_body(self, name):
+        seed = name.encode("utf-8")
+        if Image is None:
+            # Only the magic bytes are real; enough for the store, but it will not decode
+            return JPEG_HEADER + (seed * (self.image_size // max(1, len(seed)) + 1))[: max(0, self.image_size - len(JPEG_HEADER))]
+        # A real JPEG with an 8x8 block pattern per name, so images decode and do not look like duplicates
+        rng = random.Random(seed)
+        image = Image.new("RGB", (8, 8))
+        image.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(64)])
+        image = image.resize((64, 48), Image.NEAREST)
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=90)
+        padding = min(JPEG_COMMENT_LIMIT, max(0, self.image_size - buffer.tell()))
+        if padding:
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=90, comment=b"0" * padding)
+        return buffer.getvalue()
+
+    async def image(self, request):
+        await self._delay()
+        body = self._image_body(request.match_info["name"])
+        self.images_served += 1
+        self.bytes_served += len(body)
+        return web.Response(body=body, content_type="image/jpeg")
+
+    def application(self):
+        app = web.Application()
+        app.router.add_get("/cars/", self.brands_page)
+        app.router.add_get("/brand-{brand:\\d+}/", self.models_page)
+        app.router.add_get("/brand-{brand:\\d+}/model-{model:\\d+}/", self.generations_page)
+        app.router.add_get("/images/{path:.*/}{name}", self.image)
+        return app
+
+    async def start(self, host="127.0.0.1", port=0, image_port=0):
+        self._runner = web.AppRunner(self.application())
+        await self._runner.setup()
+        page_site = web.TCPSite(self._runner, host, port)
+        image_site = web.TCPSite(self._runner, host, image_port)
+        await page_site.start()
+        await image_site.start()
+        page_address, image_address = self._runner.addresses[:2]
+        self.base_url = f"http://{host}:{page_address[1]}"
+        self.image_base_url = f"http://{host}:{image_address[1]}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+
+def add_site_arguments(parser):
+    parser.add_argument("--brands", type=int, default=FAKE_BRANDS, help="number of brands on the fake site")
+    parser.add_argument("--models", type=int, default=FAKE_MODELS_PER_BRAND, help="models listed per brand")
+    parser.add_argument("--generations", type=int, default=FAKE_GENERATIONS, help="generations per multi-generation model")
+    parser.add_argument(
+        "--multi-generation-ratio",
+        type=float,
+        default=FAKE_MULTI_GENERATION_RATIO,
+        help="share of models that have a generations page",
+    )
+    parser.add_argument("--latency", type=float, default=FAKE_LATENCY, help="seconds of delay before every response")
+    parser.add_argument("--jitter", type=float, default=FAKE_JITTER, help="extra random delay of up to this many seconds")
+    parser.add_argument(
+        "--image-size",
+        type=int,
+        default=FAKE_IMAGE_SIZE,
+        help="bytes per image (approximate with Pillow, which serves real JPEGs up to about 64 KB)",
+    )
+
+
+
+def site_from_args(args):
+    return FakeAutoevolution(
+        brands=args.brands,
+        models_per_brand=args.models,
+        generations=args.generations,
+        multi_generation_ratio=args.multi_generation_ratio,
+        latency=args.latency,
+        jitter=args.jitter,
+        image_size=args.image_size,
+    )
+
+
+
+async def serve_forever(site, port, image_port):
+    base_url = await site.start(port=port, image_port=image_port)
+    print(f"Fake autoevolution serving pages at {base_url} and images at {site.image_base_url}")
+    print(f"Crawl it with: python main.py --base-url {base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await site.stop()
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a synthetic autoevolution.com for offline crawls and benchmarks")
+    add_site_arguments(parser)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--image-port", type=int, default=8081)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve_forever(site_from_args(args), args.port, args.image_port))
+    except KeyboardInterrupt:
+        pass
@@ -1,8 +1,66 @@
 import asyncio
 import json
 import re
+from cache import HttpCache
+from http_client import create_session
 from playwright.async_api import async_playwright
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from datetime import datetime
+from browser_pool import goto_and_wait_for, record_js_heap
+from metrics import METRICS
+from rate_limiter import limiter_for
+from resource_filter import ResourceFilter
+from extractors import (
+    BRAND_COUNT_SCRIPT,
+    BRANDS_SCRIPT,
+    PageFetcher,
+    extract_with_engine,
+    parse_brand_count,
+    parse_brands,
+)
+
+
+
+BASE_URL = 'https://www.autoevolution.com'
+BRANDS_URL = f'{BASE_URL}/cars/'
+BRAND_SELECTOR = ".carman"
+SCROLL_GROWTH_TIMEOUT = 4000  # How long to wait for new brands to appear after a scroll
+SCROLL_SETTLE_TIMEOUT = 5000
+MAX_SCROLL_STALLS = 2  # Consecutive scrolls without new brands before giving up
+MAX_SCROLLS = 60
+ALLOW_PARTIAL_BRAND_LIST = False
+# Resolves with the brand element count as soon as it grows past `previous`, or after `timeout` ms
+WAIT_FOR_MORE_BRANDS_SCRIPT = """
+    ([selector, previous, timeout]) => new Promise(resolve => {
+        const count = () => document.querySelectorAll(selector).length;
+        if (count() > previous) {
+            resolve(count());
+            return;
+        }
+        const observer = new MutationObserver(() => {
+            const current = count();
+            if (current > previous) {
+                observer.disconnect();
+                clearTimeout(timer);
+                resolve(current);
+            }
+        });
+        observer.observe(document.body, { childList: true, subtree: true });
+        const timer = setTimeout(() => {
+            observer.disconnect();
+            resolve(count());
+        }, timeout);
+    })
+"""
+DESKTOP_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+
+def set_base_url(base_url):
+    # Model and generation URLs come from the pages' own links, so the brand list is the only entry point
+    global BASE_URL, BRANDS_URL
+    BASE_URL = base_url.rstrip("/")
+    BRANDS_URL = f"{BASE_URL}/cars/"
 
 
 
@@ -10,82 +68,27 @@ async def run_browser():
     playwright = await async_playwright().start()    
     browser = await playwright.chromium.launch(
         headless=True,
-        slow_mo=50,
     )
     context = await browser.new_context(
         viewport={'width': 1280, 'height': 800},
-        user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        user_agent=DESKTOP_USER_AGENT
     )
+    resource_filter = ResourceFilter()
+    await resource_filter.install(context)
     page = await context.new_page()
-    return playwright, browser, context, page
+    return playwright, browser, context, page, resource_filter
 
 
 
-async def fetch_brands():
-    playwright, browser, context, page = await run_browser()    
+async def extract_brands_with_browser(on_brands=None):
+    playwright, browser, context, page, resource_filter = await run_browser()    
     try:
-        await page.goto('https://www.autoevolution.com/cars/')
-        website_brand_count = await page.evaluate("""
-            () => {
-                const element = document.querySelector('.carbrnum b');
-                return element ? parseInt(element.textContent.trim()) : null;
-            }
-        """)
-        for _ in range(8):
-            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-            await asyncio.sleep(1.5)
-        brand_data = await page.evaluate("""
-            () => {
-                const brandItems = [];
-                document.querySelectorAll('.carman').forEach(brandElement => {
-                    const h5Element = brandElement.querySelector('h5 a span');
-                    if (!h5Element) return;
-                    const brandName = h5Element.textContent.trim();
-                    if (brandName.length <= 1) return;
-                    const urlElement = brandElement.querySelector('h5 a');
-                    const url = urlElement ? urlElement.getAttribute('href') : null;
-                    const statsElement = brandElement.nextElementSibling;
-                    let inProduction = 0;
-                    let discontinued = 0;
-                    if (statsElement && statsElement.classList.contains('carnums')) {
-                        const statsTexts = statsElement.querySelectorAll('p b');
-                        if (statsTexts.length >= 2) {
-                            inProduction = parseInt(statsTexts[0].textContent.trim()) || 0;
-                            discontinued = parseInt(statsTexts[1].textContent.trim()) || 0;
-                        }
-                    }
-                      brandItems.push({
-                        name: brandName,
-                        name_normalized: brandName.toUpperCase(),
-                        url: url,
-                        in_production: inProduction,
-                        discontinued: discontinued,
-                        total_models: inProduction + discontinued
-                    });
-                });
-                return brandItems;
-            }
-        """)
-        unique_brands_normalized = set(item['name_normalized'] for item in brand_data)
-        unique_brands = set(item['name'] for item in brand_data)
-        total_brands = len(unique_brands_normalized)
-        print(f"Found {total_brands} unique car brands")
-        for i, brand in enumerate(sorted(unique_brands), 1):
-            print(f"{i}. {brand}")
-        json_filename = "car_brands.json"
-        export_data = {
-            "source": "autoevolution.com",
-            "extracted_date": datetime.now().isoformat(),
-            "total_brands": total_brands,
-            "claimed_brand_count": website_brand_count,
-            "brands_data": sorted(brand_data, key=lambda x: x['name']),
-            "brands_list": sorted(list(unique_brands))
-        }
-        with open(json_filename, 'w', encoding='utf-8') as f:
-            json.dump(export_data, f, indent=2, ensure_ascii=False)
-        print(f"\nData saved to {json_filename}")
-        await asyncio.sleep(2)
-        return json_filename
+        await goto_and_wait_for(page, BRANDS_URL, BRAND_SELECTOR)
+        website_brand_count = await page.evaluate(BRAND_COUNT_SCRIPT)
+        brand_data = await scroll_until_stable(page, website_brand_count, on_brands)
+        await record_js_heap(page)
+        resource_filter.finish_page(page, "brand list")
+        return website_brand_count, brand_data
     finally:
         await context.close()
         await browser.close()
@@ -93,6 +96,135 @@ async def fetch_brands():
 
 
 
+def count_unique_brands(brand_data):
+    return len(set(item['name_normalized'] for item in brand_data))
+
+
+
+async def scroll_until_stable(page, website_brand_count, on_brands=None):
+    limiter = limiter_for(BRANDS_URL)
+    brand_data = await page.evaluate(BRANDS_SCRIPT)
+    if on_brands is not None:
+        await on_brands(brand_data)
+    element_count = await page.evaluate(f"() => document.querySelectorAll('{BRAND_SELECTOR}').length")
+    stalls = 0
+    scrolls = 0
+    while scrolls < MAX_SCROLLS:
+        if website_brand_count is not None and count_unique_brands(brand_data) >= website_brand_count:
+            break
+        await limiter.acquire()
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        scrolls += 1
+        new_count = await page.evaluate(
+            WAIT_FOR_MORE_BRANDS_SCRIPT, [BRAND_SELECTOR, element_count, SCROLL_GROWTH_TIMEOUT]
+        )
+        if new_count <= element_count:
+            # Nothing appeared yet; give in-flight requests a chance to land before counting a stall
+            try:
+                await page.wait_for_load_state("networkidle", timeout=SCROLL_SETTLE_TIMEOUT)
+            except PlaywrightTimeoutError:
+                pass
+            new_count = await page.evaluate(f"() => document.querySelectorAll('{BRAND_SELECTOR}').length")
+        if new_count <= element_count:
+            stalls += 1
+            if stalls >= MAX_SCROLL_STALLS:
+                break
+            continue
+        stalls = 0
+        element_count = new_count
+        brand_data = await page.evaluate(BRANDS_SCRIPT)
+        if on_brands is not None:
+            await on_brands(brand_data)
+    print(f"Brand discovery stopped after {scrolls} scrolls with {count_unique_brands(brand_data)} brands")
+    METRICS.event("brand_discovery", scrolls=scrolls, brands=count_unique_brands(brand_data), claimed=website_brand_count)
+    return brand_data
+
+
+
+def parse_brand_page(html):
+    return parse_brand_count(html), parse_brands(html)
+
+
+
+def brand_list_complete(result):
+    website_brand_count, brand_data = result
+    if not brand_data:
+        return False
+    return website_brand_count is None or count_unique_brands(brand_data) >= website_brand_count
+
+
+
+async def fetch_brands(on_brands=None):
+    cache = HttpCache()
+    try:
+        async with create_session() as session:
+            website_brand_count, brand_data = await extract_with_engine(
+                "brands",
+                BRANDS_URL,
+                parse_brand_page,
+                lambda: extract_brands_with_browser(on_brands),
+                PageFetcher(session, cache),
+                user_agent=DESKTOP_USER_AGENT,
+                is_complete=brand_list_complete,
+            )
+    finally:
+        cache.close()
+    if on_brands is not None:
+        await on_brands(brand_data)
+    unique_brands_normalized = set(item['name_normalized'] for item in brand_data)
+    unique_brands = set(item['name'] for item in brand_data)
+    total_brands = len(unique_brands_normalized)
+    if website_brand_count is not None and total_brands < website_brand_count:
+        message = f"Brand discovery found only {total_brands} of the {website_brand_count} brands the site lists"
+        if not ALLOW_PARTIAL_BRAND_LIST:
+            raise RuntimeError(message)
+        print(f"Warning: {message}")
+    print(f"Found {total_brands} unique car brands")
+    for i, brand in enumerate(sorted(unique_brands), 1):
+        print(f"{i}. {brand}")
+    json_filename = "car_brands.json"
+    export_data = {
+        "source": "autoevolution.com",
+        "extracted_date": datetime.now().isoformat(),
+        "total_brands": total_brands,
+        "claimed_brand_count": website_brand_count,
+        "brands_data": sorted(brand_data, key=lambda x: x['name']),
+        "brands_list": sorted(list(unique_brands))
+    }
+    with open(json_filename, 'w', encoding='utf-8') as f:
+        json.dump(export_data, f, indent=2, ensure_ascii=False)
+    print(f"\nData saved to {json_filename}")
+    return json_filename
+
+
+
+async def stream_brands():
+    # Yields each brand as soon as discovery sees it, while fetch_brands still writes car_brands.json at the end
+    batches = asyncio.Queue()
+
+    async def on_brands(brand_data):
+        await batches.put(list(brand_data))
+
+    task = asyncio.create_task(fetch_brands(on_brands))
+    task.add_done_callback(lambda _: batches.put_nowait(None))
+    seen_names = set()
+    try:
+        while True:
+            batch = await batches.get()
+            if batch is None:
+                break
+            for brand in batch:
+                if brand["name"] not in seen_names:
+                    seen_names.add(brand["name"])
+                    yield brand
+    finally:
+        if not task.done():
+            task.cancel()
+    # Surfaces a short brand list or a failed discovery once the brands found so far are handed over
+    await task
+
+
+
 async def main():
     await fetch_brands()
         
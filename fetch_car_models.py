@@ -1,116 +1,200 @@
 import asyncio
 import json
 import os
-import aiohttp
 from urllib.parse import urlparse
 from playwright.async_api import async_playwright
-from datetime import datetime
 import re
+import time
+from cache import HttpCache
+from http_client import create_session
+from image_downloader import ImageDownloader, IMAGE_CONNECTIONS_PER_HOST
+from image_store import ImageStore
+from image_processing import ImageProcessor, apply_image_info
+from frontier import CrawlFrontier, FAILED
+from storage import RESULTS_DB, RESULTS_JSON, open_result_store
+from shard import shard_for
+from scheduler import WorkScheduler, ConcurrencyLimiter, PipelineStage
+from browser_pool import BrowserContextPool, goto_and_wait_for, record_js_heap
+from metrics import METRICS, METRICS_SAMPLE_INTERVAL, current_rss_mb
+from rate_limiter import RATE_LIMITERS
+from resource_filter import ResourceFilter
+from extractors import (
+    MODELS_SCRIPT,
+    GENERATIONS_SCRIPT,
+    PageFetcher,
+    extract_with_engine,
+    parse_car_models,
+    parse_generations,
+    print_engine_report,
+)
 
 
 
-IMAGES_DIR = "car_images"
-os.makedirs(IMAGES_DIR, exist_ok=True)
+BRAND_CONCURRENCY = 12  # Change this to control the number of concurrent brands
+PAGE_CONCURRENCY = 16  # Change this to control the number of concurrently open pages
+GENERATION_CONCURRENCY = 8  # Model pages whose generation lists are extracted at the same time
+GENERATIONS_PER_BRAND = 4  # Share of those a single brand may occupy, so one big brand cannot starve the rest
+GENERATION_PAGE_TIMEOUT = 120  # Seconds before a model's generation page is abandoned and marked failed
+CONTEXT_MAX_USES = 50  # Browser contexts are recycled after this many pages
+MODEL_SELECTOR = 'a[title*="specs and photos"]'
+GENERATION_SELECTOR = ".carseries.clearfix"
+PROCESS_IMAGES = False  # Validate downloaded images and write thumbnail/WebP variants (see image_processing.py)
 
 
 
-async def download_image(session, image_url, save_path):
+async def extract_with_browser(context_pool, url, selector, script, stage):
+    async with context_pool.page() as page:
+        await goto_and_wait_for(page, url, selector)
+        with METRICS.timer("evaluate_seconds", stage):
+            records = await page.evaluate(script)
+        await record_js_heap(page)
+        return records
+
+
+
+class CrawlResources:
+    def __init__(self, context_pool, fetcher, downloader, store, frontier, processor=None):
+        self.context_pool = context_pool
+        self.fetcher = fetcher
+        self.downloader = downloader
+        self.processor = processor
+        self.store = store
+        self.frontier = frontier
+        self.generations = PipelineStage("generation", extract_generation_data, GENERATION_CONCURRENCY)
+
+
+
+async def process_brand(brand_data, crawl):
+    brand_name = brand_data["name"]
+    brand_url = brand_data["url"]
+    print(f"Starting brand: {brand_name} at {brand_url}")
+    crawl.frontier.start(brand_url, "brand", label=brand_name)
+    start = time.monotonic()
     try:
-        async with session.get(image_url) as response:
-            if response.status == 200:
-                content = await response.read()
-                with open(save_path, "wb") as f:
-                    f.write(content)
-                return save_path
-            else:
-                print(f"Failed to download image {image_url}, status: {response.status}")
-                return None
+        result = await process_brand_page(brand_data, crawl)
     except Exception as e:
-        print(f"Error downloading {image_url}: {e}")
-        return None
+        METRICS.error("brand", e)
+        print(f"Error processing {brand_name}: {e}")
+        result = {
+            "brand_name": brand_name,
+            "brand_url": brand_url,
+            "error": str(e)
+        }
+    if "error" in result:
+        crawl.frontier.failed(brand_url, result["error"])
+    else:
+        failed_models = crawl.frontier.count_children(brand_url, FAILED)
+        if failed_models:
+            crawl.frontier.failed(brand_url, f"{failed_models} models failed")
+        else:
+            crawl.frontier.done(brand_url)
+    seconds = time.monotonic() - start
+    METRICS.observe("brand_seconds", seconds, stage="brand")
+    METRICS.event(
+        "brand",
+        brand=brand_name,
+        url=brand_url,
+        seconds=round(seconds, 3),
+        models=result.get("models_count"),
+        error=result.get("error"),
+    )
+    return result
 
 
 
-async def process_brands_batch(batch, browser, playwright):
-    results = []    
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        contexts = []
-        for brand_data in batch:
-            brand_name = brand_data["name"]
-            brand_url = brand_data["url"]
-            print(f"Queuing brand: {brand_name} at {brand_url}")
-            brand_folder = os.path.join(IMAGES_DIR, brand_name.replace(" ", "_").replace("/", "_"))
-            os.makedirs(brand_folder, exist_ok=True)
-            context = await browser.new_context(
-                **playwright.devices['iPhone 13 Pro Max']
-            )
-            contexts.append(context)
-            task = asyncio.create_task(process_brand_page(brand_data, context, session))
-            tasks.append((brand_data, task))
-        for (brand_data, task), context in zip(tasks, contexts):
-            try:
-                result = await task
-                results.append(result)
-            except Exception as e:
-                print(f"Error processing {brand_data['name']}: {e}")
-                results.append({
-                    "brand_name": brand_data["name"],
-                    "brand_url": brand_data["url"],
-                    "error": str(e)
-                })
-            finally:
-                await context.close()
-    return results
+async def collect_record_image(crawl, record):
+    # Downloads a model's or generation's image and, with post-processing on, records what it really is
+    saved_path = await crawl.downloader.download(record["image_url"])
+    if saved_path and crawl.processor is not None:
+        info = await crawl.processor.process(saved_path)
+        if not info["valid"]:
+            record["image_error"] = info["error"]
+            crawl.downloader.forget(record["image_url"])
+            return False
+        apply_image_info(record, info)
+    if saved_path:
+        record["screenshot_path"] = os.path.relpath(saved_path, os.getcwd())
+    return bool(saved_path)
+
+
+
+def finish_model(crawl, brand_name, model, position):
+    error = None
+    if "generations" in model:
+        failed_generations = 0
+        for generation in model["generations"]:
+            crawl.frontier.start(generation.get("url"), "generation", parent_url=model["url"], label=generation["name"])
+            if generation.get("screenshot_path"):
+                owner_url = generation.get("url") or f"{model['url']}#{generation['name']}"
+                crawl.downloader.store.link("generation", owner_url, generation["image_url"], brand_name, generation["name"])
+            if generation.get("image_url") and not generation.get("screenshot_path"):
+                crawl.frontier.failed(generation.get("url"), generation.get("image_error", "image download failed"))
+                failed_generations += 1
+            else:
+                crawl.frontier.done(generation.get("url"))
+        if model.pop("generations_failed", False):
+            error = "generation page extraction failed"
+        elif failed_generations:
+            error = f"{failed_generations} generation images failed"
+    elif model.get("image_url") and not model.get("screenshot_path"):
+        error = model.get("image_error", "image download failed")
+    elif model.get("screenshot_path"):
+        crawl.downloader.store.link("model", model["url"], model["image_url"], brand_name, model["name"])
+    if error:
+        crawl.frontier.failed(model["url"], error)
+    else:
+        crawl.frontier.done(model["url"])
+    crawl.store.upsert_model(brand_name, model, position)
 
 
 
-async def process_brand_page(brand_data, context, session):
+async def process_brand_page(brand_data, crawl):
     brand_name = brand_data["name"]
     brand_url = brand_data["url"]
-    brand_folder = os.path.join(IMAGES_DIR, brand_name.replace(" ", "_").replace("/", "_"))    
     try:
-        page = await context.new_page()
-        await page.goto(brand_url, wait_until="networkidle", timeout=60000)
-        car_models_data = await page.evaluate("""
-            () => {
-                const carModels = [];
-                document.querySelectorAll('a[title*="specs and photos"]').forEach(nameElement => {
-                    const modelName = nameElement.getAttribute('title').replace(' specs and photos', '').trim();
-                    const modelUrl = nameElement.getAttribute('href');
-                    let imageUrl = null;
-                    const imgElement = nameElement.querySelector('img') || 
-                                      (nameElement.parentElement ? nameElement.parentElement.querySelector('img') : null);
-                    if (imgElement) {
-                        imageUrl = imgElement.getAttribute('src');
-                        if (!imageUrl || imageUrl.includes('blank.gif')) {
-                            imageUrl = imgElement.getAttribute('data-src') || null;
-                        }
-                    }
-                    let productionYears = null;
-                    const parentElement = nameElement.closest('.container2') || nameElement.parentElement;
-                    const yearElement = parentElement ? parentElement.querySelector('.years, .semra') : null;
-                    if (yearElement) {
-                        productionYears = yearElement.textContent.trim();
-                    }
-                    carModels.push({
-                        name: modelName,
-                        url: modelUrl,
-                        image_url: imageUrl,
-                        production_years: productionYears
-                    });
-                });
-                return carModels;
-            }
-        """)
+        car_models_data = await extract_with_engine(
+            "models",
+            brand_url,
+            parse_car_models,
+            lambda: extract_with_browser(crawl.context_pool, brand_url, MODEL_SELECTOR, MODELS_SCRIPT, "models"),
+            crawl.fetcher,
+            user_agent=crawl.context_pool.context_options.get("user_agent"),
+        )
         unique_models = {}
         for model in car_models_data:
             if model.get("url") and model["url"] not in unique_models:
                 unique_models[model["url"]] = model
         car_models_data = list(unique_models.values())
         models_with_images = []
-        image_download_tasks = []
-        for model in car_models_data:
+        model_tasks = []
+        generation_slots = asyncio.Semaphore(GENERATIONS_PER_BRAND)
+
+        async def collect_generations(position, model, generation_count):
+            async with generation_slots:
+                generation_data = await crawl.generations.run(model["url"], crawl, generation_count)
+            if generation_data is None:
+                generation_data = []
+                model["generations_failed"] = True
+            model["generations"] = generation_data
+            model["generation_count"] = generation_count
+            if any(gen.get("screenshot_path") for gen in generation_data):
+                models_with_images.append(model)
+            finish_model(crawl, brand_name, model, position)
+
+        async def collect_image(position, model):
+            if await collect_record_image(crawl, model):
+                models_with_images.append(model)
+            finish_model(crawl, brand_name, model, position)
+
+        for position, model in enumerate(car_models_data):
+            if crawl.frontier.is_done(model["url"]):
+                stored_model = crawl.store.get_model(brand_name, model["url"])
+                if stored_model is not None:
+                    car_models_data[position] = stored_model
+                    if stored_model.get("screenshot_path") or any(gen.get("screenshot_path") for gen in stored_model.get("generations", [])):
+                        models_with_images.append(stored_model)
+                    continue
+            crawl.frontier.start(model["url"], "model", parent_url=brand_url, label=model["name"])
             production_years = model.get("production_years", "")
             has_multiple_generations = False
             generation_count = 0
@@ -121,25 +205,14 @@ async def process_brand_page(brand_data, context, session):
                     has_multiple_generations = generation_count > 1
             if has_multiple_generations and model.get("url"):
                 print(f"  Extracting {generation_count} generations for {model['name']}")
-                generation_data = await extract_generation_data(
-                    model["url"], context, session, brand_folder, model["name"]
-                )
-                model["generations"] = generation_data
-                model["generation_count"] = generation_count
-                if any(gen.get("screenshot_path") for gen in generation_data):
-                    models_with_images.append(model)
+                model_tasks.append(collect_generations(position, model, generation_count))
             else:
                 if model.get("image_url"):
-                    safe_model_name = model['name'].replace(' ', '_').replace('/', '_').replace('\\', '_').replace(':', '_') 
-                    image_filename = f"{safe_model_name}.jpg"
-                    image_path = os.path.join(brand_folder, image_filename)
-                    task = asyncio.create_task(download_image(session, model["image_url"], image_path))
-                    image_download_tasks.append((model, task))
-        for model, task in image_download_tasks:
-            saved_path = await task
-            if saved_path:
-                model["screenshot_path"] = os.path.relpath(saved_path, os.getcwd())
-                models_with_images.append(model)
+                    model_tasks.append(collect_image(position, model))
+                else:
+                    finish_model(crawl, brand_name, model, position)
+        # Generation pages and plain images run side by side; each model is stored as soon as its own work is done
+        await asyncio.gather(*model_tasks)
         return {
             "brand_name": brand_name,
             "brand_url": brand_url,
@@ -148,6 +221,7 @@ async def process_brand_page(brand_data, context, session):
             "car_models": car_models_data
         }
     except Exception as e:
+        METRICS.error("models", e)
         print(f"Error processing {brand_name}: {e}")
         return {
             "brand_name": brand_name,
@@ -157,156 +231,175 @@ async def process_brand_page(brand_data, context, session):
 
 
 
-async def extract_generation_data(model_url, context, session, brand_folder, model_name):
+async def extract_generation_data(model_url, crawl, expected_count=0):
     try:
-        page = await context.new_page()
-        await page.goto(model_url, wait_until="networkidle", timeout=60000)
-        generation_data = await page.evaluate("""
-            () => {
-                const generations = [];
-                const generationContainers = document.querySelectorAll('.carseries.clearfix');
-                generationContainers.forEach((container, index) => {
-                    const linkElement = container.querySelector('a.dispblock[href]');
-                    if (!linkElement) {
-                        return;
-                    }
-                    const generationUrl = linkElement.getAttribute('href');
-                    let generationName = null;
-                    let productionYears = null;
-                    const h2Element = linkElement.querySelector('h2');
-                    if (h2Element) {
-                        let fullText = h2Element.textContent.trim();
-                        const spanElement = h2Element.querySelector('span.col-red');
-                        if (spanElement) {
-                            generationName = spanElement.textContent.trim();
-                            const yearsElement = linkElement.querySelector('.years.faded.fsz16') || 
-                                               linkElement.querySelector('.years.faded') ||
-                                               linkElement.querySelector('.years') ||
-                                               linkElement.querySelector('[class*="years"]');
-                            if (yearsElement) {
-                                productionYears = yearsElement.textContent.trim();
-                                productionYears = productionYears.replace(/^\(Production years:\s*/i, '').replace(/^\(/, '').replace(/\)$/, '').trim();
-                            } else {
-                                const spanText = spanElement.textContent.trim();
-                                const textAfterSpan = fullText.replace(spanText, '').trim();
-                                const match = textAfterSpan.match(/^\(([^)]+)\)/);
-                                if (match) {
-                                    productionYears = match[1].trim();
-                                }
-                            }
-                        } else {
-                            const match = fullText.match(/^(.+?)\s*\(([^)]+)\).*$/);
-                            if (match) {
-                                generationName = match[1].trim();
-                                productionYears = match[2].trim();
-                            } else {
-                                generationName = fullText;
-                            }
-                        }
-                    }
-                    let imageUrl = null;
-                    const imgElement = linkElement.querySelector('picture img');
-                    if (imgElement) {
-                        imageUrl = imgElement.getAttribute('src');
-                        if (!imageUrl || imageUrl.includes('blank.gif')) {
-                            imageUrl = imgElement.getAttribute('data-src') || null;
-                        }
-                        if (!imageUrl) {
-                            const sourceElement = linkElement.querySelector('picture source[srcset]');
-                            if (sourceElement) {
-                                const srcset = sourceElement.getAttribute('srcset');
-                                if (srcset) {
-                                    imageUrl = srcset.split(' ')[0]; // Take first URL from srcset
-                                }
-                            }
-                        }
-                    }
-                    if (generationUrl && generationName) {
-                        generations.push({
-                            name: generationName,
-                            production_years: productionYears,
-                            url: generationUrl,
-                            image_url: imageUrl
-                        });
-                    }
-                });
-                return generations;
-            }
-        """)
-        await page.close()
-        generation_image_tasks = []
-        for generation in generation_data:
-            if generation.get("image_url"):
-                safe_generation_name = generation['name'].replace(' ', '_').replace('/', '_').replace('\\', '_').replace(':', '_').replace('(', '').replace(')', '')
-                safe_model_name = model_name.replace(' ', '_').replace('/', '_').replace('\\', '_').replace(':', '_')
-                image_filename = f"{safe_model_name}__{safe_generation_name}.jpg"
-                image_path = os.path.join(brand_folder, image_filename)
-                task = asyncio.create_task(download_image(session, generation["image_url"], image_path))
-                generation_image_tasks.append((generation, task))
-        for generation, task in generation_image_tasks:
-            saved_path = await task
-            if saved_path:
-                generation["screenshot_path"] = os.path.relpath(saved_path, os.getcwd())        
-        return generation_data  
+        generation_data = await asyncio.wait_for(
+            extract_with_engine(
+                "generations",
+                model_url,
+                parse_generations,
+                lambda: extract_with_browser(crawl.context_pool, model_url, GENERATION_SELECTOR, GENERATIONS_SCRIPT, "generations"),
+                crawl.fetcher,
+                user_agent=crawl.context_pool.context_options.get("user_agent"),
+                is_complete=lambda generations: len(generations) >= max(1, expected_count),
+            ),
+            GENERATION_PAGE_TIMEOUT,
+        )
+        await asyncio.gather(*(
+            collect_record_image(crawl, generation) for generation in generation_data if generation.get("image_url")
+        ))
+        return generation_data
+    except asyncio.TimeoutError as e:
+        METRICS.error("generations", e)
+        print(f"Gave up on generation page {model_url} after {GENERATION_PAGE_TIMEOUT}s")
+        return None
     except Exception as e:
+        METRICS.error("generations", e)
         print(f"Error extracting generation data from {model_url}: {e}")
-        return []
+        return None
+
+
+
+async def iter_brands(brands):
+    if hasattr(brands, "__aiter__"):
+        async for brand in brands:
+            yield brand
+    else:
+        for brand in brands:
+            yield brand
 
 
 
-async def fetch_car_models(brands_json_file="car_brands.json"):
+async def select_brands(brands, store, frontier, retry_failed=False, shard=None, selected=None):
+    # Filters a brand list or a live brand stream down to what this run still has to crawl
+    if retry_failed:
+        failed_brand_urls = set(frontier.urls("brand", FAILED))
+    else:
+        processed_brand_names = store.processed_brand_names()
+    seen_names = set()
+    async for brand in iter_brands(brands):
+        if brand["name"] in seen_names:
+            continue
+        seen_names.add(brand["name"])
+        if shard is not None and shard_for(brand, shard[1]) != shard[0]:
+            continue
+        if retry_failed:
+            if brand["url"] not in failed_brand_urls:
+                continue
+        elif brand["name"] in processed_brand_names:
+            continue
+        frontier.add(brand["url"], "brand", label=brand["name"])
+        if selected is not None:
+            selected.append(brand["name"])
+        yield brand
+
+
+
+async def fetch_car_models(brands_json_file="car_brands.json", results_db=RESULTS_DB, results_json=RESULTS_JSON, retry_failed=False, shard=None, brand_source=None, process_images=PROCESS_IMAGES):
     try:
-        existing_results = {}
-        if os.path.exists("car_models.json"):
-            try:
-                with open("car_models.json", "r", encoding="utf-8") as f:
-                    existing_results = json.load(f)
-            except Exception as e:
-                print(f"Error loading existing car_models.json: {e}")
-                existing_results = {}        
-        with open(brands_json_file, "r", encoding="utf-8") as f:
-            brands_data = json.load(f)
-        brands = brands_data["brands_data"]
+        if brand_source is None:
+            with open(brands_json_file, "r", encoding="utf-8") as f:
+                brand_source = json.load(f)["brands_data"]
+        store = open_result_store(results_db, results_json)
+        frontier = CrawlFrontier(results_db)
+        recovered = frontier.recover()
+        if recovered:
+            print(f"Resuming {recovered} URLs that were in flight when the last run stopped")
         playwright = await async_playwright().start()
-        browser = await playwright.chromium.launch(
-            headless=True,
-            slow_mo=50,
-        )
         try:
-            batch_size = 12  # Change this to control the number of concurrent brands
-            all_results = existing_results.get("brand_models", [])
-            processed_brand_names = {brand["brand_name"] for brand in all_results if "brand_name" in brand}
-            brands_to_process = [brand for brand in brands if brand["name"] not in processed_brand_names]
-            for i in range(0, len(brands_to_process), batch_size):
-                batch = brands_to_process[i:i+batch_size]
-                print(f"\nProcessing batch {i//batch_size + 1} of {(len(brands_to_process) + batch_size - 1) // batch_size}")
-                start_time = datetime.now()
-                batch_results = await process_brands_batch(batch, browser, playwright)
-                end_time = datetime.now()
-                duration = end_time - start_time
-                print(f"Completed batch in: {duration.total_seconds():.2f} seconds")
-                brand_results_map = {}
-                for result in all_results:
-                    if "brand_name" in result:
-                        brand_results_map[result["brand_name"]] = result
-                for result in batch_results:
-                    if "brand_name" in result:
-                        brand_results_map[result["brand_name"]] = result
-                all_results = list(brand_results_map.values())
-                car_models_data = {
-                    "extraction_date": datetime.now().isoformat(),
-                    "total_brands_processed": len(all_results),
-                    "brand_models": all_results
-                }
-                with open("car_models.json", "w", encoding="utf-8") as f:
-                    json.dump(car_models_data, f, indent=2, ensure_ascii=False)
-                await asyncio.sleep(1)
-            total_models = sum(result.get("models_count", 0) for result in all_results if "models_count" in result)
-            total_models_with_images = sum(result.get("models_with_images", 0) for result in all_results if "models_with_images" in result)   
+            brands_to_process = []
+            if shard is not None:
+                print(f"Crawling shard {shard[0]}/{shard[1]} of the brands")
+            print(f"\nProcessing brands with {BRAND_CONCURRENCY} brand slots and {PAGE_CONCURRENCY} page slots")
+
+            def on_brand_result(brand_data, result):
+                if "brand_name" in result:
+                    store.upsert_brand(result)
+
+            scheduler = WorkScheduler(BRAND_CONCURRENCY, name="brand slot")
+            page_limiter = ConcurrencyLimiter(PAGE_CONCURRENCY, name="page")
+            resource_filter = ResourceFilter()
+            context_pool = BrowserContextPool(
+                launch_browser=lambda: playwright.chromium.launch(headless=True),
+                context_options=playwright.devices['iPhone 13 Pro Max'],
+                size=PAGE_CONCURRENCY,
+                max_uses=CONTEXT_MAX_USES,
+                limiter=page_limiter,
+                resource_filter=resource_filter,
+            )
+            cache = HttpCache()
+            image_store = ImageStore()
+            try:
+                async with create_session(limit_per_host=PAGE_CONCURRENCY) as session, \
+                        create_session(limit_per_host=IMAGE_CONNECTIONS_PER_HOST) as image_session:
+                    fetcher = PageFetcher(session, cache)
+                    downloader = ImageDownloader(image_session, image_store, cache)
+                    processor = ImageProcessor() if process_images else None
+                    crawl = CrawlResources(context_pool, fetcher, downloader, store, frontier, processor)
+                    sampler = asyncio.create_task(METRICS.sample({
+                        "rss_mb": current_rss_mb,
+                        "pages_in_use": lambda: page_limiter.in_use,
+                        "generation_queue_depth": crawl.generations.queue.qsize,
+                        "image_queue_depth": downloader.stage.queue.qsize,
+                        "processing_queue_depth": lambda: processor.stage.queue.qsize() if processor else 0,
+                    }, METRICS_SAMPLE_INTERVAL))
+                    try:
+                        await scheduler.run(
+                            select_brands(brand_source, store, frontier, retry_failed, shard, brands_to_process),
+                            lambda brand_data: process_brand(brand_data, crawl),
+                            on_result=on_brand_result,
+                        )
+                    finally:
+                        sampler.cancel()
+                        await crawl.generations.close()
+                        await downloader.close()
+                        if processor is not None:
+                            await processor.close()
+                image_store.flag_placeholders()
+                image_store.print_report()
+            finally:
+                await context_pool.close()
+                cache.close()
+                image_store.close()
+            if results_json:
+                store.export_json(results_json)
+            print(f"Completed {len(brands_to_process)} brands in: {scheduler.elapsed():.2f} seconds")
+            METRICS.stage("brand", jobs=sum(scheduler.slot_jobs), seconds=round(scheduler.elapsed(), 3))
+            stages = [crawl.generations, downloader.stage] + ([processor.stage] if processor else [])
+            for stage in stages:
+                METRICS.stage(
+                    stage.name,
+                    processed=stage.processed,
+                    errors=stage.errors,
+                    peak_queue_depth=stage.peak_queue_depth,
+                    utilization=round(stage.utilization(), 4),
+                )
+            METRICS.increment("duplicates_skipped_total", store.duplicates_skipped, stage="store")
+            scheduler.print_report()
+            crawl.generations.print_report()
+            downloader.stage.print_report()
+            if processor is not None:
+                processor.stage.print_report()
+            page_limiter.print_report()
+            context_pool.print_report()
+            resource_filter.print_report()
+            print_engine_report()
+            downloader.print_report()
+            if processor is not None:
+                processor.print_report()
+            cache.print_report()
+            frontier.print_report()
+            RATE_LIMITERS.print_report()
+            counts = store.counts()
+            print(
+                f"Stored {counts['brands']} brands, {counts['models']} models and {counts['generations']} generations "
+                f"({store.duplicates_skipped} duplicate URLs skipped)"
+            )
         finally:
-            await browser.close()
+            store.close()
+            frontier.close()
             await playwright.stop()
-        return "car_models.json"        
+        return results_json or results_db
     except Exception as e:
         print(f"Error in fetch_car_models: {e}")
         return None
@@ -0,0 +1,124 @@
+import sqlite3
+import time
+
+
+
+FRONTIER_DB = "car_models.sqlite3"
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+STATUSES = (PENDING, IN_FLIGHT, DONE, FAILED)
+
+
+
+class CrawlFrontier:
+    def __init__(self, path=FRONTIER_DB):
+        self.path = path
+        self._connection = sqlite3.connect(path, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                url TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                parent_url TEXT,
+                label TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS frontier_kind_status ON frontier(kind, status);
+            CREATE INDEX IF NOT EXISTS frontier_parent ON frontier(parent_url);
+        """)
+
+    def recover(self):
+        # Anything still in flight was interrupted by a crash; queue it again
+        cursor = self._connection.execute(
+            "UPDATE frontier SET status = ?, updated_at = ? WHERE status = ?",
+            (PENDING, time.time(), IN_FLIGHT),
+        )
+        return cursor.rowcount
+
+    def add(self, url, kind, parent_url=None, label=None):
+        if not url:
+            return
+        self._connection.execute(
+            """
+            INSERT INTO frontier (url, kind, parent_url, label, status, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO NOTHING
+            """,
+            (url, kind, parent_url, label, PENDING, time.time()),
+        )
+
+    def start(self, url, kind, parent_url=None, label=None):
+        if not url:
+            return
+        self._connection.execute(
+            """
+            INSERT INTO frontier (url, kind, parent_url, label, status, attempts, updated_at)
+            VALUES (?, ?, ?, ?, ?, 1, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                status = excluded.status,
+                attempts = frontier.attempts + 1,
+                parent_url = COALESCE(excluded.parent_url, frontier.parent_url),
+                label = COALESCE(excluded.label, frontier.label),
+                updated_at = excluded.updated_at
+            """,
+            (url, kind, parent_url, label, IN_FLIGHT, time.time()),
+        )
+
+    def _set_status(self, url, status, error=None):
+        if not url:
+            return
+        self._connection.execute(
+            "UPDATE frontier SET status = ?, last_error = ?, updated_at = ? WHERE url = ?",
+            (status, error, time.time(), url),
+        )
+
+    def done(self, url):
+        self._set_status(url, DONE)
+
+    def failed(self, url, error):
+        self._set_status(url, FAILED, str(error))
+
+    def status(self, url):
+        if not url:
+            return None
+        row = self._connection.execute("SELECT status FROM frontier WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def is_done(self, url):
+        return self.status(url) == DONE
+
+    def count_children(self, parent_url, status):
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM frontier WHERE parent_url = ? AND status = ?", (parent_url, status)
+        ).fetchone()[0]
+
+    def urls(self, kind, status):
+        return [
+            row[0]
+            for row in self._connection.execute(
+                "SELECT url FROM frontier WHERE kind = ? AND status = ? ORDER BY rowid", (kind, status)
+            )
+        ]
+
+    def counts(self):
+        counts = {}
+        for kind, status, count in self._connection.execute(
+            "SELECT kind, status, COUNT(*) FROM frontier GROUP BY kind, status"
+        ):
+            counts.setdefault(kind, dict.fromkeys(STATUSES, 0))[status] = count
+        return counts
+
+    def close(self):
+        self._connection.close()
+
+    def print_report(self):
+        for kind, counts in sorted(self.counts().items()):
+            print(
+                f"Frontier ({kind}s): " + ", ".join(f"{counts[status]} {status.replace('_', '-')}" for status in STATUSES)
+            )
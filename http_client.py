@@ -0,0 +1,22 @@
+import aiohttp
+
+
+
+CONNECTION_LIMIT = 100
+CONNECTIONS_PER_HOST = 16
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 30
+REQUEST_TIMEOUT = 120
+READ_TIMEOUT = 30
+
+
+
+def create_session(limit=CONNECTION_LIMIT, limit_per_host=CONNECTIONS_PER_HOST, headers=None):
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+    )
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT, sock_read=READ_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers)
@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import os
+import sys
+import time
+import aiohttp
+from metrics import METRICS
+from rate_limiter import limiter_for
+from scheduler import PipelineStage
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+
+IMAGE_CONCURRENCY = 32
+IMAGE_CONNECTIONS_PER_HOST = 16
+IMAGE_RETRIES = 3
+IMAGE_RETRY_BACKOFF = 1.0
+CHUNK_SIZE = 64 * 1024
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+
+class RetryableDownloadError(Exception):
+    pass
+
+
+
+def _discard_temp_file(handle, temp_path):
+    handle.close()
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+
+
+class ImageDownloader:
+    def __init__(self, session, store, cache=None, concurrency=IMAGE_CONCURRENCY, retries=IMAGE_RETRIES, backoff=IMAGE_RETRY_BACKOFF):
+        self.session = session
+        self.store = store
+        self.cache = cache
+        self.retries = retries
+        self.backoff = backoff
+        self.downloaded = 0
+        self.unchanged = 0
+        self.shared = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.retried = 0
+        self.bytes_written = 0
+        self.started_at = time.monotonic()
+        self.stage = PipelineStage("image", self._download_with_retries, concurrency)
+        self._in_flight = {}
+
+    async def download(self, image_url):
+        # Every model or generation showing the same URL waits on a single download
+        task = self._in_flight.get(image_url)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(image_url))
+            self._in_flight[image_url] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(image_url, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def forget(self, image_url):
+        # For an image that turned out to be unusable, so a retry downloads it instead of revalidating it
+        self.store.forget_url(image_url)
+        if self.cache is not None:
+            self.cache.delete(image_url)
+
+    async def _fetch(self, image_url):
+        stored_path = self.store.path_for_url(image_url)
+        entry = self.cache.get(image_url) if self.cache is not None and stored_path is not None else None
+        if stored_path is not None and (self.cache is None or self.cache.is_fresh(entry)):
+            if self.cache is not None:
+                self.cache.record("image", "hit")
+            self.unchanged += 1
+            return stored_path
+        return await self.stage.run(image_url, entry)
+
+    async def _download_with_retries(self, image_url, entry):
+        for attempt in range(self.retries + 1):
+            try:
+                saved_path = await self._download_once(image_url, entry)
+            except (RetryableDownloadError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt < self.retries:
+                    self.retried += 1
+                    METRICS.increment("retries_total", stage="image")
+                    await asyncio.sleep(self.backoff * (2 ** attempt))
+                    continue
+                print(f"Error downloading {image_url}: {e}")
+                saved_path = None
+            except Exception as e:
+                print(f"Error downloading {image_url}: {e}")
+                saved_path = None
+            if not saved_path:
+                self.failed += 1
+                METRICS.increment("failures_total", stage="image")
+            return saved_path
+
+    async def close(self):
+        await self.stage.close()
+
+    async def _download_once(self, image_url, entry=None):
+        headers = self.cache.conditional_headers(entry) if entry is not None else None
+        limiter = limiter_for(image_url, "images")
+        await limiter.acquire()
+        start = time.monotonic()
+        status = None
+        try:
+            async with self.session.get(image_url, headers=headers) as response:
+                status = response.status
+                limiter.record(
+                    status=response.status,
+                    latency=time.monotonic() - start,
+                    retry_after=response.headers.get("Retry-After"),
+                )
+                saved_path = await self._save_response(image_url, entry, response)
+                size = response.content.total_bytes
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                limiter.record(timeout=True)
+            METRICS.request("image", image_url, time.monotonic() - start, status=status, error=e)
+            raise
+        METRICS.request("image", image_url, time.monotonic() - start, status=status, size=size)
+        return saved_path
+
+    async def _save_response(self, image_url, entry, response):
+        if response.status == 304 and entry is not None:
+            self.cache.touch(image_url, response.headers)
+            self.cache.record("image", "revalidated")
+            self.unchanged += 1
+            return self.store.path_for_url(image_url)
+        if response.status in RETRYABLE_STATUSES:
+            raise RetryableDownloadError(f"status {response.status}")
+        if response.status != 200:
+            print(f"Failed to download image {image_url}, status: {response.status}")
+            return None
+        handle, temp_path = await asyncio.to_thread(self.store.open_temp_file)
+        digest = hashlib.sha256()
+        try:
+            size = 0
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                await asyncio.to_thread(handle.write, chunk)
+                digest.update(chunk)
+                size += len(chunk)
+        except BaseException:
+            await asyncio.to_thread(_discard_temp_file, handle, temp_path)
+            raise
+        if entry is not None and entry["content_hash"] == digest.hexdigest():
+            await asyncio.to_thread(_discard_temp_file, handle, temp_path)
+            self.cache.touch(image_url, response.headers)
+            self.cache.record("image", "revalidated")
+            self.unchanged += 1
+            return self.store.path_for_url(image_url)
+        await asyncio.to_thread(handle.close)
+        saved_path, created = await self.store.add(temp_path, digest.hexdigest(), image_url, size)
+        if self.cache is not None:
+            self.cache.put(image_url, response.headers, digest.hexdigest())
+            self.cache.record("image", "miss")
+        if created:
+            self.downloaded += 1
+            self.bytes_written += size
+        else:
+            # Same bytes already stored under another URL
+            self.duplicates += 1
+        return saved_path
+
+    def print_report(self):
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        megabytes = self.bytes_written / (1024 * 1024)
+        peak = peak_rss_mb()
+        print(
+            f"Images: {self.downloaded} downloaded, {self.unchanged} unchanged, {self.shared} shared URLs, "
+            f"{self.duplicates} duplicate contents, {self.failed} failed, {self.retried} retries, "
+            f"{megabytes:.1f} MB in {elapsed:.2f}s "
+            f"({self.downloaded / elapsed:.2f} images/s, {megabytes / elapsed:.2f} MB/s)"
+        )
+        if peak is not None:
+            print(f"Peak RSS: {peak:.1f} MB")
@@ -0,0 +1,134 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from image_store import IMAGE_STORE_DIR, sniff_file_extension
+from metrics import METRICS
+from scheduler import PipelineStage
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+
+VARIANTS_DIR = os.path.join(IMAGE_STORE_DIR, "variants")
+# Variants produced for every downloaded image; width/height bound the size (never upscaled), None keeps it
+IMAGE_VARIANTS = {
+    "thumb": {"width": 320, "height": 320, "format": "WEBP", "quality": 80},
+    "webp": {"width": None, "height": None, "format": "WEBP", "quality": 85},
+}
+PROCESSING_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+VARIANT_EXTENSIONS = {"WEBP": ".webp", "JPEG": ".jpg", "PNG": ".png", "AVIF": ".avif"}
+
+
+
+def _variant_image(image, spec):
+    variant = image.copy()
+    if spec.get("width") or spec.get("height"):
+        variant.thumbnail((spec.get("width") or image.width, spec.get("height") or image.height))
+    if spec["format"] == "JPEG" and variant.mode not in ("RGB", "L"):
+        variant = variant.convert("RGB")
+    elif variant.mode not in ("RGB", "RGBA", "L"):
+        variant = variant.convert("RGBA" if variant.mode in ("LA", "P", "PA") else "RGB")
+    return variant
+
+
+
+def process_image(path, variants, variants_dir):
+    # Runs in a worker process: validates the file, reads its real format and size, and writes missing variants
+    if Image is None:
+        extension = sniff_file_extension(path)
+        if extension == ".bin":
+            return {"valid": False, "error": "unrecognised image format"}
+        return {"valid": True, "format": extension.lstrip("."), "variants": {}, "created": 0}
+    try:
+        with Image.open(path) as image:
+            image.verify()
+        with Image.open(path) as image:
+            image.load()
+            info = {
+                "valid": True,
+                "format": (image.format or "").lower(),
+                "width": image.width,
+                "height": image.height,
+                "variants": {},
+                "created": 0,
+            }
+            # Variants are named after the blob, so identical images share them too
+            stem = os.path.splitext(os.path.basename(path))[0]
+            for name, spec in variants.items():
+                extension = VARIANT_EXTENSIONS.get(spec["format"], "." + spec["format"].lower())
+                variant_path = os.path.join(variants_dir, name, stem[:2], stem[2:4], stem + extension)
+                if not os.path.exists(variant_path):
+                    os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+                    temp_path = f"{variant_path}.{os.getpid()}.part"
+                    _variant_image(image, spec).save(temp_path, spec["format"], quality=spec.get("quality", 85))
+                    os.replace(temp_path, variant_path)
+                    info["created"] += 1
+                info["variants"][name] = variant_path
+            return info
+    except Exception as e:
+        return {"valid": False, "error": f"{type(e).__name__}: {e}"}
+
+
+
+class ImageProcessor:
+    def __init__(self, variants=None, workers=PROCESSING_WORKERS, variants_dir=VARIANTS_DIR):
+        self.variants = IMAGE_VARIANTS if variants is None else variants
+        self.variants_dir = variants_dir
+        self.workers = max(1, int(workers))
+        self.processed = 0
+        self.invalid = 0
+        self.variants_created = 0
+        # Spawned workers only import this module, instead of inheriting the crawler's loop and threads
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self.stage = PipelineStage("post-processing", self._run, self.workers * 2)
+        self._results = {}
+        if Image is None:
+            print("Pillow is not installed; images are only checked for a known format, without variants")
+
+    async def process(self, path):
+        task = self._results.get(path)
+        if task is None:
+            task = asyncio.ensure_future(self.stage.run(path))
+            self._results[path] = task
+        return await asyncio.shield(task)
+
+    async def _run(self, path):
+        start = time.monotonic()
+        info = await asyncio.get_running_loop().run_in_executor(
+            self._executor, process_image, path, self.variants, self.variants_dir
+        )
+        METRICS.observe("image_processing_seconds", time.monotonic() - start, stage="post-processing")
+        self.processed += 1
+        self.variants_created += info.pop("created", 0)
+        if not info["valid"]:
+            self.invalid += 1
+            METRICS.increment("invalid_images_total", stage="post-processing")
+            print(f"Invalid image {path}: {info['error']}")
+        return info
+
+    async def close(self):
+        await self.stage.close()
+        await asyncio.to_thread(self._executor.shutdown)
+
+    def print_report(self):
+        print(
+            f"Post-processing: {self.processed} images checked on {self.workers} processes, "
+            f"{self.invalid} invalid, {self.variants_created} variants written"
+        )
+
+
+
+def apply_image_info(record, info):
+    record["image_format"] = info.get("format")
+    if "width" in info:
+        record["image_width"] = info["width"]
+        record["image_height"] = info["height"]
+    if info.get("variants"):
+        record["image_variants"] = {
+            name: os.path.relpath(path, os.getcwd()) for name, path in info["variants"].items()
+        }
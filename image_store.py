@@ -0,0 +1,275 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+
+IMAGE_STORE_DIR = "car_images"
+MANIFEST_NAME = "manifest.sqlite3"
+NEAR_DUPLICATE_DISTANCE = 3  # Bits two average hashes may differ by and still count as the same picture
+PLACEHOLDER_MIN_REFERENCES = 3  # Models/generations sharing one picture before it is flagged as a placeholder
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+]
+
+
+
+def sniff_extension(header):
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return ".webp"
+    if header[4:12] in (b"ftypavif", b"ftypavis"):
+        return ".avif"
+    return ".bin"
+
+
+
+def sniff_file_extension(path):
+    with open(path, "rb") as f:
+        return sniff_extension(f.read(16))
+
+
+
+def average_hash(path):
+    # 64-bit aHash: one bit per pixel of an 8x8 grayscale thumbnail, set when brighter than the mean
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as image:
+            pixels = list(image.convert("L").resize((8, 8)).getdata())
+    except Exception:
+        return None
+    mean = sum(pixels) / len(pixels)
+    value = 0
+    for pixel in pixels:
+        value = (value << 1) | (pixel > mean)
+    return value
+
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+
+def _hash_bands(value, bands):
+    # Two hashes within `bands - 1` bits of each other agree exactly on at least one band
+    width = 64 // bands
+    for band in range(bands):
+        bits = width if band < bands - 1 else 64 - width * (bands - 1)
+        yield band, (value >> (band * width)) & ((1 << bits) - 1)
+
+
+
+def _move_into_place(temp_path, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(temp_path, path)
+
+
+
+def _remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+
+class ImageStore:
+    def __init__(self, root=IMAGE_STORE_DIR, compute_hashes=True):
+        self.root = root
+        self.blobs_dir = os.path.join(root, "blobs")
+        self.temp_dir = os.path.join(root, "tmp")
+        self.compute_hashes = compute_hashes and Image is not None
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.temp_dir, exist_ok=True)
+        # Shared by sharded workers on one machine, like the HTTP cache
+        self._connection = sqlite3.connect(os.path.join(root, MANIFEST_NAME), isolation_level=None, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                average_hash TEXT,
+                placeholder INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                hash TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS refs (
+                kind TEXT NOT NULL,
+                owner_url TEXT NOT NULL,
+                image_url TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                brand_name TEXT,
+                label TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (kind, owner_url)
+            );
+            CREATE INDEX IF NOT EXISTS refs_hash ON refs(hash);
+        """)
+
+    def blob_path(self, digest, extension):
+        return os.path.join(self.blobs_dir, digest[:2], digest[2:4], digest + extension)
+
+    def open_temp_file(self):
+        fd, temp_path = tempfile.mkstemp(dir=self.temp_dir, suffix=".part")
+        return os.fdopen(fd, "wb"), temp_path
+
+    def path_for_url(self, url):
+        row = self._connection.execute(
+            "SELECT blobs.path FROM urls JOIN blobs ON blobs.hash = urls.hash WHERE urls.url = ?", (url,)
+        ).fetchone()
+        if row is None or not os.path.exists(row[0]):
+            return None
+        return row[0]
+
+    async def add(self, temp_path, digest, url, size):
+        # Returns the blob path and whether these bytes were new to the store
+        row = self._connection.execute("SELECT path FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        if row is not None and os.path.exists(row[0]):
+            await asyncio.to_thread(_remove_file, temp_path)
+            path, created = row[0], False
+        else:
+            extension = await asyncio.to_thread(sniff_file_extension, temp_path)
+            path = self.blob_path(digest, extension)
+            await asyncio.to_thread(_move_into_place, temp_path, path)
+            value = await asyncio.to_thread(average_hash, path) if self.compute_hashes else None
+            self._connection.execute(
+                """
+                INSERT INTO blobs (hash, path, size, average_hash, created_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(hash) DO UPDATE SET path = excluded.path, size = excluded.size,
+                    average_hash = COALESCE(excluded.average_hash, blobs.average_hash)
+                """,
+                (digest, path, size, f"{value:016x}" if value is not None else None, time.time()),
+            )
+            created = True
+        self._connection.execute(
+            """
+            INSERT INTO urls (url, hash, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET hash = excluded.hash, updated_at = excluded.updated_at
+            """,
+            (url, digest, time.time()),
+        )
+        return path, created
+
+    def forget_url(self, url):
+        # The blob stays for any other URL with the same bytes; this URL is downloaded again next time
+        self._connection.execute("DELETE FROM urls WHERE url = ?", (url,))
+
+    def link(self, kind, owner_url, image_url, brand_name=None, label=None):
+        self._connection.execute(
+            """
+            INSERT INTO refs (kind, owner_url, image_url, hash, brand_name, label, updated_at)
+            SELECT ?, ?, ?, hash, ?, ?, ? FROM urls WHERE url = ?
+            ON CONFLICT(kind, owner_url) DO UPDATE SET
+                image_url = excluded.image_url,
+                hash = excluded.hash,
+                brand_name = excluded.brand_name,
+                label = excluded.label,
+                updated_at = excluded.updated_at
+            """,
+            (kind, owner_url, image_url, brand_name, label, time.time(), image_url),
+        )
+
+    def near_duplicate_groups(self, max_distance=NEAR_DUPLICATE_DISTANCE):
+        hashes = {
+            digest: int(value, 16)
+            for digest, value in self._connection.execute(
+                "SELECT hash, average_hash FROM blobs WHERE average_hash IS NOT NULL"
+            )
+        }
+        parent = {digest: digest for digest in hashes}
+
+        def find(digest):
+            while parent[digest] != digest:
+                parent[digest] = parent[parent[digest]]
+                digest = parent[digest]
+            return digest
+
+        buckets = {}
+        for digest, value in hashes.items():
+            for key in _hash_bands(value, max_distance + 1):
+                buckets.setdefault(key, []).append(digest)
+        for candidates in buckets.values():
+            for index, digest in enumerate(candidates):
+                for other in candidates[index + 1:]:
+                    if find(digest) != find(other) and hamming_distance(hashes[digest], hashes[other]) <= max_distance:
+                        parent[find(other)] = find(digest)
+        groups = {}
+        for digest in hashes:
+            groups.setdefault(find(digest), []).append(digest)
+        return [group for group in groups.values() if len(group) > 1]
+
+    def flag_placeholders(self, max_distance=NEAR_DUPLICATE_DISTANCE, min_references=PLACEHOLDER_MIN_REFERENCES):
+        # A picture (or near-identical pictures) shown for many different models is a stand-in, not a photo
+        references = dict(self._connection.execute("SELECT hash, COUNT(*) FROM refs GROUP BY hash"))
+        groups = self.near_duplicate_groups(max_distance)
+        grouped = {digest for group in groups for digest in group}
+        groups.extend([digest] for digest in references if digest not in grouped)
+        flagged = [group for group in groups if sum(references.get(digest, 0) for digest in group) >= min_references]
+        self._connection.execute("BEGIN")
+        try:
+            self._connection.execute("UPDATE blobs SET placeholder = 0")
+            self._connection.executemany(
+                "UPDATE blobs SET placeholder = 1 WHERE hash = ?", [(digest,) for group in flagged for digest in group]
+            )
+            self._connection.execute("COMMIT")
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        return flagged
+
+    def references(self, hashes, limit=5):
+        placeholders = ",".join("?" * len(hashes))
+        return self._connection.execute(
+            f"SELECT kind, brand_name, label FROM refs WHERE hash IN ({placeholders}) ORDER BY brand_name, label LIMIT ?",
+            (*hashes, limit),
+        ).fetchall()
+
+    def counts(self):
+        blobs, total_bytes, placeholders = self._connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(placeholder), 0) FROM blobs"
+        ).fetchone()
+        urls = self._connection.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        refs = self._connection.execute("SELECT COUNT(*) FROM refs").fetchone()[0]
+        return {"blobs": blobs, "bytes": total_bytes, "placeholders": placeholders, "urls": urls, "refs": refs}
+
+    def close(self):
+        self._connection.close()
+
+    def print_report(self):
+        counts = self.counts()
+        print(
+            f"Image store: {counts['blobs']} unique images ({counts['bytes'] / (1024 * 1024):.1f} MB) "
+            f"for {counts['urls']} image URLs and {counts['refs']} models/generations, "
+            f"{counts['placeholders']} flagged as placeholders"
+        )
+
+
+
+if __name__ == "__main__":
+    store = ImageStore(sys.argv[1] if len(sys.argv) > 1 else IMAGE_STORE_DIR)
+    try:
+        for group in store.flag_placeholders():
+            examples = ", ".join(f"{brand} / {label}" for _, brand, label in store.references(group))
+            print(f"Placeholder used by {len(group)} image(s), e.g. {examples}")
+        store.print_report()
+    finally:
+        store.close()
@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from image_downloader import peak_rss_mb
+from json_stream import iter_json_array, write_json_stream
+from storage import SQLiteResultStore
+
+
+
+BENCHMARK_SCRIPT = os.path.abspath(__file__)
+DEFAULT_BRAND_COUNTS = [50, 200, 800]
+SYNTHETIC_MODELS_PER_BRAND = 30
+SYNTHETIC_GENERATIONS = 5  # Generations of each multi-generation model
+SYNTHETIC_MULTI_GENERATION_RATIO = 0.4
+# Each mode runs in its own process so its peak RSS is not hidden by an earlier, larger one
+MODES = [
+    ("idle", "interpreter and imports only"),
+    ("json.load", "old reader: whole file with json.load"),
+    ("stream read", "iter_json_array over brand_models"),
+    ("import", "car_models.json into SQLite, streamed"),
+    ("json.dump", "old writer: every brand in a list, then json.dump"),
+    ("export", "SQLite into car_models.json, streamed"),
+]
+
+
+
+def synthetic_brand(index, models_per_brand, generations, multi_generation_ratio):
+    # Same shape as a scraped brand result, deterministic per brand
+    rng = random.Random(index)
+    brand_name = f"BRAND {index:05d}"
+    brand_url = f"https://www.autoevolution.com/brand-{index}/"
+    car_models = []
+    for model_index in range(models_per_brand):
+        name = f"{brand_name} Model {model_index}"
+        url = f"{brand_url}model-{model_index}/"
+        start_year = rng.randint(1960, 2020)
+        model = {
+            "name": name,
+            "url": url,
+            "image_url": f"https://s1.cdn.autoevolution.com/images/models/brand-{index}-model-{model_index}.jpg",
+            "production_years": f"1 Generation{start_year} - {start_year + rng.randint(1, 10)}",
+        }
+        if rng.random() < multi_generation_ratio:
+            model["production_years"] = f"{generations} Generations{start_year} - Present"
+            model["generations"] = [
+                {
+                    "name": f"{name} (G{generation})",
+                    "production_years": f"{start_year + generation * 5} - {start_year + generation * 5 + 5}",
+                    "url": f"{url}g{generation}/",
+                    "image_url": f"https://s1.cdn.autoevolution.com/images/models/brand-{index}-model-{model_index}-g{generation}.jpg",
+                    "screenshot_path": f"car_images/blobs/{rng.getrandbits(64):016x}.jpg",
+                }
+                for generation in range(generations)
+            ]
+            model["generation_count"] = generations
+        else:
+            model["screenshot_path"] = f"car_images/blobs/{rng.getrandbits(64):016x}.jpg"
+        car_models.append(model)
+    return {
+        "brand_name": brand_name,
+        "brand_url": brand_url,
+        "models_count": len(car_models),
+        "models_with_images": len(car_models),
+        "car_models": car_models,
+    }
+
+
+
+def write_synthetic_results(path, brands, args):
+    header = {"extraction_date": "2024-01-01T00:00:00", "total_brands_processed": brands}
+    results = (
+        synthetic_brand(index, args.models, args.generations, args.multi_generation_ratio) for index in range(brands)
+    )
+    return write_json_stream(path, header, "brand_models", results)
+
+
+
+def run_mode(mode, json_file, results_db, output_file):
+    # Runs inside a worker process; returns how many brands the mode touched
+    if mode == "idle":
+        return 0
+    if mode == "json.load":
+        with open(json_file, "r", encoding="utf-8") as f:
+            return len(json.load(f)["brand_models"])
+    if mode == "stream read":
+        return sum(1 for _ in iter_json_array(json_file, "brand_models"))
+    store = SQLiteResultStore(results_db)
+    try:
+        if mode == "import":
+            return store.import_json(json_file)
+        if mode == "json.dump":
+            brand_models = list(store.iter_brand_results())
+            with open(output_file, "w", encoding="utf-8") as f:
+                json.dump({"brand_models": brand_models}, f, indent=2, ensure_ascii=False)
+            return len(brand_models)
+        store.export_json(output_file)
+        return store.brand_result_count()
+    finally:
+        store.close()
+
+
+
+def run_worker(args):
+    start = time.monotonic()
+    brands = run_mode(args.worker, args.json_file, args.results_db, args.output_file)
+    return {"brands": brands, "seconds": time.monotonic() - start, "peak_rss_mb": peak_rss_mb()}
+
+
+
+def run_benchmark(args):
+    results = []
+    for brands in args.brand_counts:
+        with tempfile.TemporaryDirectory(prefix="car-scraper-json-benchmark-") as workdir:
+            json_file = os.path.join(workdir, "car_models.json")
+            write_synthetic_results(json_file, brands, args)
+            row = {"brand_count": brands, "file_mb": os.path.getsize(json_file) / (1024 * 1024), "modes": {}}
+            for mode, _ in MODES:
+                result_file = os.path.join(workdir, "result.json")
+                command = [
+                    sys.executable, BENCHMARK_SCRIPT,
+                    "--worker", mode,
+                    "--json-file", json_file,
+                    "--results-db", os.path.join(workdir, "car_models.sqlite3"),
+                    "--output-file", os.path.join(workdir, "export.json"),
+                    "--result-file", result_file,
+                ]
+                completed = subprocess.run(command, cwd=workdir)
+                if completed.returncode != 0 or not os.path.exists(result_file):
+                    print(f"{mode} with {brands} brands failed (exit code {completed.returncode})")
+                    continue
+                with open(result_file, "r", encoding="utf-8") as f:
+                    row["modes"][mode] = json.load(f)
+                os.remove(result_file)
+            results.append(row)
+            print(f"Measured {brands} brands ({row['file_mb']:.1f} MB of JSON)")
+    return results
+
+
+
+def print_results(results):
+    print("\nPeak RSS in MB (seconds) by brand count:")
+    print(f"{'mode':>12} " + " ".join(f"{row['brand_count']:>10} brands" for row in results))
+    print(f"{'file size':>12} " + " ".join(f"{row['file_mb']:>13.1f} MB" for row in results))
+    for mode, description in MODES:
+        cells = []
+        for row in results:
+            result = row["modes"].get(mode)
+            if result is None or result["peak_rss_mb"] is None:
+                cells.append(f"{'n/a':>16}")
+            else:
+                cells.append(f"{result['peak_rss_mb']:>8.1f} ({result['seconds']:>5.2f}s)")
+        print(f"{mode:>12} " + " ".join(cells) + f"  {description}")
+
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Measure peak memory of reading and writing car_models.json as the number of brands grows"
+    )
+    parser.add_argument("--brand-counts", type=int, nargs="+", default=DEFAULT_BRAND_COUNTS, help="dataset sizes to compare")
+    parser.add_argument("--models", type=int, default=SYNTHETIC_MODELS_PER_BRAND, help="models per synthetic brand")
+    parser.add_argument("--generations", type=int, default=SYNTHETIC_GENERATIONS, help="generations per multi-generation model")
+    parser.add_argument(
+        "--multi-generation-ratio",
+        type=float,
+        default=SYNTHETIC_MULTI_GENERATION_RATIO,
+        help="share of models with generations",
+    )
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    parser.add_argument("--worker", choices=[mode for mode, _ in MODES], help=argparse.SUPPRESS)
+    parser.add_argument("--json-file", help=argparse.SUPPRESS)
+    parser.add_argument("--results-db", help=argparse.SUPPRESS)
+    parser.add_argument("--output-file", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        result = run_worker(args)
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return
+    results = run_benchmark(args)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import json
+import os
+
+
+
+JSON_CHUNK_SIZE = 64 * 1024  # Characters read at a time; a record larger than this just takes a few reads
+JSON_WHITESPACE = " \t\n\r"
+JSON_NUMBER_CHARS = "0123456789.eE+-"
+_DECODER = json.JSONDecoder()
+
+
+
+class _JsonReader:
+    # Holds only the unread tail of the file plus whatever the current value needs
+    def __init__(self, f, chunk_size=JSON_CHUNK_SIZE):
+        self._file = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def _read(self, size):
+        chunk = self._file.read(size)
+        if not chunk:
+            self.eof = True
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+
+    def _skip_whitespace(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in JSON_WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer) or self.eof:
+                return
+            self._read(self.chunk_size)
+
+    def peek(self):
+        self._skip_whitespace()
+        return self.buffer[self.position:self.position + 1]
+
+    def take(self, expected):
+        char = self.peek()
+        if not char or char not in expected:
+            raise json.JSONDecodeError(f"Expected one of {expected!r}", self.buffer, self.position)
+        self.position += 1
+        return char
+
+    def value(self):
+        while True:
+            self._skip_whitespace()
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                # Grow geometrically so a large record is re-parsed only a logarithmic number of times
+                self._read(max(self.chunk_size, len(self.buffer) - self.position))
+                continue
+            if not self.eof and not self.buffer[end:].strip(JSON_NUMBER_CHARS):
+                # A number cut off by the chunk boundary ("12" of "123", or "12." of "12.75") still decodes
+                # as a shorter one, so read on until something other than number characters follows it
+                self._read(self.chunk_size)
+                continue
+            self.position = end
+            return value
+
+
+
+def iter_json_array(path, key, chunk_size=JSON_CHUNK_SIZE):
+    # Yields the items of one top-level array, e.g. "brand_models", one at a time
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _JsonReader(f, chunk_size)
+        reader.take("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            name = reader.value()
+            reader.take(":")
+            if name == key:
+                reader.take("[")
+                if reader.peek() == "]":
+                    return
+                while True:
+                    yield reader.value()
+                    if reader.take(",]") == "]":
+                        return
+            reader.value()
+            if reader.take(",}") == "}":
+                return
+
+
+
+def _indented(value, indent, level):
+    return json.dumps(value, indent=indent, ensure_ascii=False).replace("\n", "\n" + " " * (indent * level))
+
+
+
+def write_json_stream(path, fields, key, items, indent=2):
+    # Writes the same text as json.dump({**fields, key: list(items)}, indent=2), one item at a time
+    temp_path = f"{path}.part"
+    count = 0
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write("{")
+        for name, value in fields.items():
+            f.write(f"\n{' ' * indent}{json.dumps(name)}: {_indented(value, indent, 1)},")
+        f.write(f"\n{' ' * indent}{json.dumps(key)}: [")
+        for item in items:
+            f.write(("," if count else "") + f"\n{' ' * indent * 2}{_indented(item, indent, 2)}")
+            count += 1
+        f.write(f"\n{' ' * indent}]\n}}" if count else "]\n}")
+    os.replace(temp_path, path)
+    return count
@@ -1,69 +1,83 @@
+import argparse
 import asyncio
 import os
 import sys
-import json
 from datetime import datetime
-from fetch_brands import fetch_brands
+from fetch_brands import fetch_brands, set_base_url, stream_brands
 from fetch_car_models import fetch_car_models
+from metrics import METRICS, METRICS_FILE, metrics_path_for_shard
+from shard import merge_shards, parse_shard, run_workers, shard_paths
 
 
 
-def cleanup_car_models_data(file_path="car_models.json"):
-    if not os.path.exists(file_path):
-        return False
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if "brand_models" not in data:
-            return False
-        total_brands = len(data["brand_models"])
-        total_models_before = sum(
-            len(brand.get("car_models", [])) 
-            for brand in data["brand_models"]
-        )
-        for brand in data["brand_models"]:
-            if "car_models" not in brand:
-                continue
-            unique_models = {}
-            for model in brand.get("car_models", []):
-                if "url" in model and model["url"]:
-                    if model["url"] not in unique_models:
-                        unique_models[model["url"]] = model
-            brand["car_models"] = list(unique_models.values())
-            brand["models_count"] = len(brand["car_models"])
-            brand["models_with_images"] = sum(1 for model in brand["car_models"] if "local_image_path" in model)
-        total_models_after = sum(
-            len(brand.get("car_models", [])) 
-            for brand in data["brand_models"]
-        )
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        duplicates_removed = total_models_before - total_models_after
-        return True
-    except Exception as e:
-        print(f"Error during cleanup: {e}")
-        return False
+async def prepare_brands_file(brands_file, reuse_existing):
+    if reuse_existing and os.path.exists(brands_file):
+        return brands_file
+    return await fetch_brands()
 
 
 
-async def run_full_scraper():
+async def run_full_scraper(retry_failed=False, brands_file="car_brands.json", shard=None, workers=1, export=True, metrics_file=METRICS_FILE, metrics_port=None, process_images=False):
     start_time = datetime.now()
+    if metrics_file:
+        if shard is not None:
+            METRICS.open(metrics_path_for_shard(metrics_file, shard), shard=f"{shard[0]}/{shard[1]}")
+        else:
+            METRICS.open(metrics_file)
+    metrics_server = await METRICS.serve(metrics_port) if metrics_port else None
+    success = False
     try:
-        brands_file = await fetch_brands()
-        if not brands_file or not os.path.exists(brands_file):
-            print(f"Error: Brands file not generated or not found at {brands_file}")
-            return False
-        await asyncio.sleep(2)
-        models_file = await fetch_car_models(brands_file)
+        success = await run_stages(retry_failed, brands_file, shard, workers, export, metrics_file, process_images)
+    finally:
+        duration = datetime.now() - start_time
+        METRICS.event("run", seconds=round(duration.total_seconds(), 3), success=success, workers=workers)
+        print(f"\nTotal run time: {duration}")
+        METRICS.print_report()
+        METRICS.close()
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+    return success
+
+
+
+async def run_stages(retry_failed, brands_file, shard, workers, export, metrics_file, process_images=False):
+    try:
+        if workers == 1 and shard is None and not retry_failed:
+            # Brands flow straight into the model stage while discovery is still scrolling
+            models_file = await fetch_car_models(brands_file, brand_source=stream_brands(), process_images=process_images)
+        else:
+            brands_file = await prepare_brands_file(brands_file, reuse_existing=retry_failed or shard is not None)
+            if not brands_file or not os.path.exists(brands_file):
+                print(f"Error: Brands file not generated or not found at {brands_file}")
+                return False
+            if workers > 1:
+                shard_dbs, success = await run_workers(
+                    workers,
+                    brands_file,
+                    retry_failed=retry_failed,
+                    metrics_file=metrics_file,
+                    process_images=process_images,
+                )
+                models_file = merge_shards(shard_dbs)
+                if not success:
+                    # The shards that did finish are merged, but the run must not look complete
+                    print("Error: some workers failed, so the merged results are incomplete (see their shards above)")
+                    return False
+            elif shard is not None:
+                results_db, results_json = shard_paths(*shard)
+                models_file = await fetch_car_models(
+                    brands_file,
+                    results_db=results_db,
+                    results_json=results_json if export else None,
+                    retry_failed=retry_failed,
+                    shard=shard,
+                    process_images=process_images,
+                )
+            else:
+                models_file = await fetch_car_models(brands_file, retry_failed=retry_failed, process_images=process_images)
         if not models_file or not os.path.exists(models_file):
             print(f"Error: Models file not generated or not found at {models_file}")
             return False
-        cleanup_success = cleanup_car_models_data(models_file)
-        if not cleanup_success:
-            print(f"Error: Cleanup process failed for {models_file}")
-            return False
-        end_time = datetime.now()
-        duration = end_time - start_time
         return True
     except Exception as e:
         print(f"Error during scraping process: {e}")
@@ -71,9 +85,90 @@ async def run_full_scraper():
 
 
 
+def shard_argument(value):
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape car brands, models, generations and images from autoevolution.com")
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="re-crawl only brands, models and generations that failed in earlier runs",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="split the brands across this many local worker processes, each with its own browser",
+    )
+    parser.add_argument(
+        "--shard",
+        type=shard_argument,
+        help="only crawl shard INDEX/COUNT of the brands (INDEX starts at 0), writing to per-shard outputs",
+    )
+    parser.add_argument(
+        "--brands-file",
+        default="car_brands.json",
+        help="brand list to crawl; sharded runs reuse it when it already exists",
+    )
+    parser.add_argument(
+        "--merge",
+        nargs="*",
+        metavar="SHARD_DB",
+        help="merge per-shard outputs (default: all car_models.shard-*.sqlite3 files) into car_models.json and exit",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=METRICS_FILE,
+        help="append per-request and per-stage metrics to this JSON lines file (empty to disable)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve live metrics in Prometheus text format on this port at /metrics",
+    )
+    parser.add_argument(
+        "--base-url",
+        help="crawl a mirror or a local fake site (see fake_site.py) instead of https://www.autoevolution.com",
+    )
+    parser.add_argument(
+        "--process-images",
+        action="store_true",
+        help="validate downloaded images and write thumbnail/WebP variants on a process pool (needs Pillow)",
+    )
+    parser.add_argument("--no-export", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and args.shard is not None:
+        parser.error("--workers and --shard cannot be combined")
+    return args
+
+
+
 def main():
+    args = parse_args()
+    if args.merge is not None:
+        merge_shards(args.merge or None)
+        sys.exit(0)
+    if args.base_url:
+        set_base_url(args.base_url)
     print("Starting...")
-    success = asyncio.run(run_full_scraper())
+    success = asyncio.run(run_full_scraper(
+        retry_failed=args.retry_failed,
+        brands_file=args.brands_file,
+        shard=args.shard,
+        workers=args.workers,
+        export=not args.no_export,
+        metrics_file=args.metrics_file,
+        metrics_port=args.metrics_port,
+        process_images=args.process_images,
+    ))
     sys.exit(0 if success else 1)
 
 
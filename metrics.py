@@ -0,0 +1,214 @@
+import asyncio
+import contextlib
+import json
+import os
+import time
+
+
+
+METRICS_FILE = "metrics.jsonl"
+METRICS_SAMPLE_INTERVAL = 15  # Seconds between samples of queue depths and memory
+METRIC_PREFIX = "car_scraper"
+
+
+
+def current_rss_mb():
+    # Resident set size right now, as opposed to the peak that resource.getrusage reports
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+
+def metrics_path_for_shard(path, shard):
+    root, extension = os.path.splitext(path)
+    return f"{root}.shard-{shard[0]}-of-{shard[1]}{extension}"
+
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"') for _, value in key)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + "}"
+
+
+
+class MetricsRecorder:
+    def __init__(self):
+        self.counters = {}
+        self.distributions = {}
+        self.gauges = {}
+        self.peaks = {}
+        self.context = {}
+        self.path = None
+        self.started_at = time.monotonic()
+        self._file = None
+
+    def open(self, path, **context):
+        self.close()
+        self.path = path
+        self.context = context
+        self._file = open(path, "a", encoding="utf-8")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def event(self, kind, **fields):
+        if self._file is None:
+            return
+        record = {"time": round(time.time(), 3), "kind": kind, **self.context, **fields}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        stats = self.distributions.get(key)
+        if stats is None:
+            stats = {"count": 0, "sum": 0.0, "min": value, "max": value}
+            self.distributions[key] = stats
+        stats["count"] += 1
+        stats["sum"] += value
+        stats["min"] = min(stats["min"], value)
+        stats["max"] = max(stats["max"], value)
+
+    def set_gauge(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        self.gauges[key] = value
+        self.peaks[key] = max(self.peaks.get(key, value), value)
+
+    def error(self, stage, error):
+        error_type = type(error).__name__
+        self.increment("errors_total", stage=stage, type=error_type)
+        self.event("error", stage=stage, type=error_type, message=str(error)[:500])
+
+    def request(self, stage, url, seconds, status=None, size=None, error=None):
+        self.increment("requests_total", stage=stage, status=status if error is None else "error")
+        self.observe("request_seconds", seconds, stage=stage)
+        if size is not None:
+            self.increment("request_bytes_total", size, stage=stage)
+        if error is not None:
+            self.error(stage, error)
+        self.event(
+            "request",
+            stage=stage,
+            url=url,
+            status=status,
+            seconds=round(seconds, 4),
+            bytes=size,
+            error=type(error).__name__ if error is not None else None,
+        )
+
+    @contextlib.contextmanager
+    def timer(self, name, stage):
+        # Only times the block; errors are counted where they are caught, so each one is counted once
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start, stage=stage)
+
+    def stage(self, name, **fields):
+        for field, value in fields.items():
+            if isinstance(value, (int, float)):
+                self.set_gauge(f"stage_{field}", value, stage=name)
+        self.event("stage", stage=name, **fields)
+
+    async def sample(self, probes, interval=METRICS_SAMPLE_INTERVAL):
+        # Runs until cancelled, recording each probe as a gauge and one JSON line per sample
+        while True:
+            values = {}
+            for name, probe in probes.items():
+                try:
+                    value = probe()
+                except Exception:
+                    value = None
+                if value is not None:
+                    self.set_gauge(name, value)
+                    values[name] = value
+            self.event("sample", **values)
+            await asyncio.sleep(interval)
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started_at
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "counters": {name + _format_labels(key): value for (name, key), value in sorted(self.counters.items())},
+            "distributions": {
+                name + _format_labels(key): {
+                    "count": stats["count"],
+                    "mean": stats["sum"] / stats["count"],
+                    "min": stats["min"],
+                    "max": stats["max"],
+                    "sum": stats["sum"],
+                }
+                for (name, key), stats in sorted(self.distributions.items())
+            },
+            "peaks": {name + _format_labels(key): value for (name, key), value in sorted(self.peaks.items())},
+        }
+
+    def prometheus_text(self):
+        lines = []
+        for kind, items in (("counter", self.counters), ("gauge", self.gauges)):
+            emitted = set()
+            for (name, key), value in sorted(items.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                if metric not in emitted:
+                    lines.append(f"# TYPE {metric} {kind}")
+                    emitted.add(metric)
+                lines.append(f"{metric}{_format_labels(key)} {value}")
+        emitted = set()
+        for (name, key), stats in sorted(self.distributions.items()):
+            metric = f"{METRIC_PREFIX}_{name}"
+            if metric not in emitted:
+                lines.append(f"# TYPE {metric} summary")
+                emitted.add(metric)
+            lines.append(f"{metric}_count{_format_labels(key)} {stats['count']}")
+            lines.append(f"{metric}_sum{_format_labels(key)} {stats['sum']}")
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, port, host="127.0.0.1"):
+        from aiohttp import web
+
+        async def handle_metrics(request):
+            return web.Response(text=self.prometheus_text(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        print(f"Serving Prometheus metrics on http://{host}:{port}/metrics")
+        return runner
+
+    def print_report(self):
+        summary = self.summary()
+        print(f"\nMetrics summary after {summary['elapsed_seconds']:.2f} seconds:")
+        for name, stats in summary["distributions"].items():
+            print(
+                f"  {name}: {stats['count']} observations, mean {stats['mean']:.3f}, "
+                f"min {stats['min']:.3f}, max {stats['max']:.3f}, total {stats['sum']:.1f}"
+            )
+        for name, value in summary["counters"].items():
+            print(f"  {name}: {value}")
+        for name, value in summary["peaks"].items():
+            print(f"  peak {name}: {value:.1f}" if isinstance(value, float) else f"  peak {name}: {value}")
+        if self.path:
+            print(f"Per-request metrics written to {self.path}")
+
+
+
+METRICS = MetricsRecorder()
@@ -0,0 +1,423 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+from json_stream import iter_json_array
+from storage import RESULTS_DB, RESULTS_JSON, SQLiteResultStore
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+
+INDEX_DB = "car_models.index.sqlite3"
+INDEX_MMAP_SIZE = 256 * 1024 * 1024  # Bytes of the index SQLite may map instead of reading through its page cache
+INDEX_BATCH_SIZE = 5000  # Rows inserted per executemany while building, and per Parquet row group when exporting
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+YEAR_PATTERN = re.compile(r"(?<!\d)(1[89]\d\d|20\d\d)(?!\d)")
+COLUMNS = [
+    ("kind", "TEXT"),
+    ("brand", "TEXT"),
+    ("model", "TEXT"),
+    ("name", "TEXT"),
+    ("url", "TEXT"),
+    ("model_url", "TEXT"),
+    ("production_years", "TEXT"),
+    ("year_start", "INTEGER"),
+    ("year_end", "INTEGER"),
+    ("in_production", "INTEGER"),
+    ("generation_count", "INTEGER"),
+    ("has_image", "INTEGER"),
+    ("image_url", "TEXT"),
+    ("screenshot_path", "TEXT"),
+    ("image_format", "TEXT"),
+    ("image_width", "INTEGER"),
+    ("image_height", "INTEGER"),
+    ("image_variants", "TEXT"),
+]
+
+
+
+def parse_production_years(text):
+    # "7 Generations1975 - Present" -> (1975, None, True), "2014 - 2020" -> (2014, 2020, False)
+    if not text:
+        return None, None, False
+    years = [int(year) for year in YEAR_PATTERN.findall(text)]
+    in_production = "present" in text.lower()
+    if not years:
+        return None, None, in_production
+    if in_production:
+        return years[0], None, True
+    return years[0], years[1] if len(years) > 1 else years[0], False
+
+
+
+def source_signature(path):
+    # SQLite keeps recent writes in the -wal file, so both files decide whether the index is stale
+    signature = []
+    for candidate in (path, f"{path}-wal"):
+        if os.path.exists(candidate):
+            stat = os.stat(candidate)
+            signature.append([candidate, stat.st_size, stat.st_mtime_ns])
+    return json.dumps(signature)
+
+
+
+def default_source():
+    return RESULTS_DB if os.path.exists(RESULTS_DB) else RESULTS_JSON
+
+
+
+def iter_source_brands(source):
+    if source.endswith((".sqlite3", ".db")):
+        store = SQLiteResultStore(source)
+        try:
+            yield from store.iter_brand_results()
+        finally:
+            store.close()
+    else:
+        yield from iter_json_array(source, "brand_models")
+
+
+
+def _has_image(kind, item):
+    # Multi-generation models keep their pictures on their generations, as models_with_images counts them
+    if item.get("screenshot_path"):
+        return True
+    return kind == "model" and any(generation.get("screenshot_path") for generation in item.get("generations") or [])
+
+
+
+def _record(kind, brand_name, model, item):
+    year_start, year_end, in_production = parse_production_years(item.get("production_years"))
+    variants = item.get("image_variants")
+    return (
+        kind,
+        brand_name,
+        model.get("name"),
+        item.get("name"),
+        item.get("url"),
+        model.get("url"),
+        item.get("production_years"),
+        year_start,
+        year_end,
+        int(in_production),
+        model.get("generation_count") if kind == "model" else None,
+        int(_has_image(kind, item)),
+        item.get("image_url"),
+        item.get("screenshot_path"),
+        item.get("image_format"),
+        item.get("image_width"),
+        item.get("image_height"),
+        json.dumps(variants, ensure_ascii=False) if variants else None,
+    )
+
+
+
+def iter_records(brand_results):
+    # One flat row per model and per generation
+    for result in brand_results:
+        brand_name = result.get("brand_name")
+        for model in result.get("car_models") or []:
+            yield _record("model", brand_name, model, model)
+            for generation in model.get("generations") or []:
+                yield _record("generation", brand_name, model, generation)
+
+
+
+class CarIndex:
+    def __init__(self, path=INDEX_DB):
+        self.path = path
+        self._connection = None
+
+    def connection(self):
+        # Opened on first query, read-only and memory-mapped
+        if self._connection is None:
+            self._connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._connection.row_factory = sqlite3.Row
+            self._connection.execute(f"PRAGMA mmap_size={INDEX_MMAP_SIZE}")
+        return self._connection
+
+    def is_current(self, source):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            row = self.connection().execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        except sqlite3.Error:
+            return False
+        return row is not None and row[0] == source_signature(source)
+
+    def build(self, source):
+        # Built next to the live index and swapped in, so readers never see a half-written file
+        self.close()
+        temp_path = f"{self.path}.part"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        connection = sqlite3.connect(temp_path, isolation_level=None)
+        try:
+            connection.execute("PRAGMA journal_mode=OFF")
+            connection.execute("PRAGMA synchronous=OFF")
+            columns = ", ".join(f"{name} {kind}" for name, kind in COLUMNS)
+            connection.executescript(f"""
+                CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE records (id INTEGER PRIMARY KEY, {columns});
+            """)
+            insert = f"INSERT INTO records ({', '.join(name for name, _ in COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+            connection.execute("BEGIN")
+            batch = []
+            for record in iter_records(iter_source_brands(source)):
+                batch.append(record)
+                if len(batch) >= INDEX_BATCH_SIZE:
+                    connection.executemany(insert, batch)
+                    batch = []
+            connection.executemany(insert, batch)
+            connection.execute("COMMIT")
+            # Taken after reading, since closing the results database checkpoints its -wal file
+            signature = source_signature(source)
+            # Indexes are created after the bulk insert, which is much faster than maintaining them row by row
+            connection.executescript("""
+                CREATE INDEX records_brand ON records(brand COLLATE NOCASE, kind);
+                CREATE INDEX records_model ON records(model COLLATE NOCASE, kind);
+                CREATE INDEX records_name ON records(name COLLATE NOCASE);
+                CREATE INDEX records_years ON records(year_start, year_end);
+                CREATE INDEX records_image ON records(has_image, kind);
+            """)
+            connection.execute("INSERT INTO meta (key, value) VALUES ('source', ?)", (signature,))
+            connection.execute("ANALYZE")
+        finally:
+            connection.close()
+        os.replace(temp_path, self.path)
+        return self.count()
+
+    def query(
+        self,
+        brand=None,
+        model=None,
+        name=None,
+        kind=None,
+        year=None,
+        year_from=None,
+        year_to=None,
+        has_image=None,
+        contains=None,
+        limit=None,
+    ):
+        # Yields rows straight from the cursor, so large results are never held in memory at once
+        conditions = []
+        parameters = []
+        if brand is not None:
+            conditions.append("brand = ? COLLATE NOCASE")
+            parameters.append(brand)
+        if model is not None:
+            conditions.append("model = ? COLLATE NOCASE")
+            parameters.append(model)
+        if name is not None:
+            conditions.append("name = ? COLLATE NOCASE")
+            parameters.append(name)
+        if kind is not None:
+            conditions.append("kind = ?")
+            parameters.append(kind)
+        if year is not None:
+            year_from = year_to = year
+        # A model or generation overlaps the range when it started before its end and had not ended before its start
+        if year_to is not None:
+            conditions.append("year_start <= ?")
+            parameters.append(year_to)
+        if year_from is not None:
+            conditions.append("(year_end >= ? OR (year_end IS NULL AND year_start IS NOT NULL))")
+            parameters.append(year_from)
+        if has_image is not None:
+            conditions.append("has_image = ?")
+            parameters.append(int(has_image))
+        if contains:
+            conditions.append("(brand || ' ' || name) LIKE ?")
+            parameters.append(f"%{contains}%")
+        sql = "SELECT * FROM records"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+        for row in self.connection().execute(sql, parameters):
+            record = dict(row)
+            del record["id"]
+            yield record
+
+    def count(self):
+        return self.connection().execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def summary(self):
+        return self.connection().execute(
+            """
+            SELECT kind, COUNT(*), COUNT(DISTINCT brand), SUM(has_image), SUM(year_start IS NULL)
+            FROM records GROUP BY kind ORDER BY kind
+            """
+        ).fetchall()
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def print_report(self):
+        for kind, rows, brands, with_images, without_years in self.summary():
+            print(
+                f"Index ({kind}s): {rows} rows across {brands} brands, {with_images} with images, "
+                f"{without_years} without parseable production years"
+            )
+
+
+
+def open_index(source=None, path=INDEX_DB, rebuild=False):
+    source = source or default_source()
+    index = CarIndex(path)
+    if rebuild or not index.is_current(source):
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"No scraped data at {source}")
+        print(f"Indexing {source} into {path}")
+        rows = index.build(source)
+        print(f"Indexed {rows} models and generations")
+    return index
+
+
+
+def export_format(path, format=None):
+    if format:
+        return format
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"Cannot tell the export format from {path}; use one of {', '.join(EXPORT_FORMATS)}")
+    return extension
+
+
+
+def _parquet_schema():
+    types = {"TEXT": pyarrow.string(), "INTEGER": pyarrow.int64()}
+    return pyarrow.schema([(name, types[kind]) for name, kind in COLUMNS])
+
+
+
+def export_records(records, path, format=None):
+    # Streams rows to the file; returns how many were written
+    format = export_format(path, format)
+    if format == "parquet" and pyarrow is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    names = [name for name, _ in COLUMNS]
+    written = 0
+    temp_path = f"{path}.part"
+    if format == "parquet":
+        schema = _parquet_schema()
+        writer = pyarrow.parquet.ParquetWriter(temp_path, schema)
+        try:
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= INDEX_BATCH_SIZE:
+                    writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                    written += len(batch)
+                    batch = []
+            if batch:
+                writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                written += len(batch)
+        finally:
+            writer.close()
+    else:
+        with open(temp_path, "w", encoding="utf-8", newline="") as f:
+            if format == "csv":
+                writer = csv.DictWriter(f, fieldnames=names)
+                writer.writeheader()
+                for record in records:
+                    writer.writerow(record)
+                    written += 1
+            else:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    written += 1
+    os.replace(temp_path, path)
+    return written
+
+
+
+def print_records(records):
+    shown = 0
+    for record in records:
+        years = record["production_years"] or "unknown years"
+        image = "image" if record["has_image"] else "no image"
+        if record["kind"] == "model":
+            print(f"{record['brand']} / {record['name']} ({years}, {image})")
+        else:
+            print(f"{record['brand']} / {record['model']} / {record['name']} ({years}, {image})")
+        shown += 1
+    print(f"{shown} matching rows")
+
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Query and export scraped brands, models and generations")
+    parser.add_argument("--source", help=f"scraped data to index (default: {RESULTS_DB}, else {RESULTS_JSON})")
+    parser.add_argument("--index", default=INDEX_DB, help="index file, rebuilt whenever the source changes")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the index even if it looks current")
+    parser.add_argument("--brand", help="exact brand name, case-insensitive")
+    parser.add_argument("--model", help="exact model name, case-insensitive")
+    parser.add_argument("--generation", help="exact generation name, case-insensitive")
+    parser.add_argument("--contains", help="substring of the brand and model or generation name")
+    parser.add_argument("--kind", choices=["model", "generation"], help="only models or only generations")
+    parser.add_argument("--year", type=int, help="in production during this year")
+    parser.add_argument("--from-year", type=int, help="in production at some point from this year")
+    parser.add_argument("--to-year", type=int, help="in production at some point up to this year")
+    images = parser.add_mutually_exclusive_group()
+    images.add_argument("--with-images", dest="has_image", action="store_true", default=None, help="only rows with a stored image")
+    images.add_argument("--without-images", dest="has_image", action="store_false", default=None, help="only rows lacking an image")
+    parser.add_argument("--limit", type=int, help="stop after this many rows")
+    parser.add_argument("--export", metavar="PATH", help="write the matching rows to a .csv, .jsonl or .parquet file")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="export format when PATH has another extension")
+    parser.add_argument("--summary", action="store_true", help="print row counts per kind and exit")
+    return parser.parse_args()
+
+
+
+def main():
+    args = parse_args()
+    try:
+        index = open_index(args.source, args.index, args.rebuild)
+    except FileNotFoundError as e:
+        print(e)
+        sys.exit(1)
+    try:
+        if args.summary:
+            index.print_report()
+            return
+        records = index.query(
+            brand=args.brand,
+            model=args.model,
+            name=args.generation,
+            kind="generation" if args.generation and not args.kind else args.kind,
+            year=args.year,
+            year_from=args.from_year,
+            year_to=args.to_year,
+            has_image=args.has_image,
+            contains=args.contains,
+            limit=args.limit,
+        )
+        if args.export:
+            try:
+                written = export_records(records, args.export, args.format)
+            except (ValueError, RuntimeError) as e:
+                print(e)
+                sys.exit(1)
+            print(f"Exported {written} rows to {args.export}")
+        else:
+            print_records(records)
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
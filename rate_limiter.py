@@ -0,0 +1,118 @@
+import asyncio
+import time
+from urllib.parse import urlparse
+
+
+
+# Starting rate, bounds and latency target (seconds) per kind of host
+HOST_PROFILES = {
+    "pages": {"rate": 4.0, "min_rate": 0.5, "max_rate": 20.0, "burst": 8, "target_latency": 3.0},
+    "images": {"rate": 20.0, "min_rate": 2.0, "max_rate": 100.0, "burst": 32, "target_latency": 1.5},
+}
+THROTTLE_STATUSES = {429, 503}
+BACKOFF_FACTOR = 0.5
+SLOWDOWN_FACTOR = 0.8
+RAMP_UP_STEPS = 20  # Successful requests needed to climb from min_rate back to max_rate
+
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, host, rate, min_rate, max_rate, burst, target_latency):
+        self.host = host
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.target_latency = target_latency
+        self.ramp_step = (max_rate - min_rate) / RAMP_UP_STEPS
+        self.requests = 0
+        self.throttled = 0
+        self.timeouts = 0
+        self.waited = 0.0
+        self.peak_rate = rate
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+        self.requests += 1
+        self.waited += time.monotonic() - start
+
+    def record(self, status=None, latency=None, timeout=False, retry_after=None):
+        if timeout or status in THROTTLE_STATUSES:
+            if timeout:
+                self.timeouts += 1
+            else:
+                self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * BACKOFF_FACTOR)
+            self._tokens = min(self._tokens, 0.0)
+            delay = parse_retry_after(retry_after)
+            if delay:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        elif latency is not None and latency > self.target_latency:
+            self.rate = max(self.min_rate, self.rate * SLOWDOWN_FACTOR)
+        elif status is not None and status < 400:
+            self.rate = min(self.max_rate, self.rate + self.ramp_step)
+            self.peak_rate = max(self.peak_rate, self.rate)
+
+    def print_report(self):
+        print(
+            f"Rate limiter {self.host}: {self.requests} requests, {self.throttled} throttled, "
+            f"{self.timeouts} timeouts, rate {self.rate:.1f}/s (peak {self.peak_rate:.1f}/s), "
+            f"{self.waited:.1f}s spent waiting"
+        )
+
+
+
+class RateLimiterRegistry:
+    def __init__(self, profiles=None):
+        self.profiles = profiles or HOST_PROFILES
+        self._limiters = {}
+
+    def for_url(self, url, profile="pages"):
+        host = urlparse(url).netloc or url
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(host, **self.profiles[profile])
+            self._limiters[host] = limiter
+        return limiter
+
+    def print_report(self):
+        for host in sorted(self._limiters):
+            self._limiters[host].print_report()
+
+
+
+RATE_LIMITERS = RateLimiterRegistry()
+
+
+
+def limiter_for(url, profile="pages"):
+    return RATE_LIMITERS.for_url(url, profile)
@@ -0,0 +1,109 @@
+import re
+
+
+
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+BLOCKED_URL_PATTERNS = [
+    r"doubleclick\.net",
+    r"googlesyndication\.com",
+    r"googletagservices\.com",
+    r"googletagmanager\.com",
+    r"google-analytics\.com",
+    r"adservice\.google\.",
+    r"amazon-adsystem\.com",
+    r"facebook\.(net|com)/tr",
+    r"connect\.facebook\.net",
+    r"scorecardresearch\.com",
+    r"quantserve\.com",
+    r"criteo\.(com|net)",
+    r"taboola\.com",
+    r"outbrain\.com",
+    r"hotjar\.com",
+    r"moatads\.com",
+    r"adnxs\.com",
+    r"pubmatic\.com",
+    r"rubiconproject\.com",
+    r"/ads?/",
+    r"/analytics",
+]
+# Blocked requests never transfer, so their size is estimated per resource type
+ESTIMATED_BYTES = {
+    "image": 60_000,
+    "media": 500_000,
+    "font": 40_000,
+    "script": 45_000,
+    "stylesheet": 20_000,
+    "xhr": 5_000,
+    "fetch": 5_000,
+}
+DEFAULT_ESTIMATED_BYTES = 10_000
+
+
+
+class ResourceFilter:
+    def __init__(self, blocked_types=None, blocked_patterns=None, verbose=True):
+        self.blocked_types = set(BLOCKED_RESOURCE_TYPES if blocked_types is None else blocked_types)
+        patterns = BLOCKED_URL_PATTERNS if blocked_patterns is None else blocked_patterns
+        self._url_pattern = re.compile("|".join(patterns), re.IGNORECASE) if patterns else None
+        self.verbose = verbose
+        self.requests_allowed = 0
+        self.requests_blocked = 0
+        self.bytes_avoided = 0
+        self.blocked_by_type = {}
+        self._page_stats = {}
+
+    def should_block(self, resource_type, url):
+        if resource_type in self.blocked_types:
+            return True
+        return bool(self._url_pattern and self._url_pattern.search(url))
+
+    async def install(self, context):
+        await context.route("**/*", self._handle_route)
+
+    def _stats_for(self, request):
+        try:
+            page = request.frame.page
+        except Exception:
+            page = None
+        if page is not None and page.is_closed():
+            page = None
+        stats = self._page_stats.get(page)
+        if stats is None:
+            stats = {"allowed": 0, "blocked": 0, "bytes_avoided": 0}
+            self._page_stats[page] = stats
+        return stats
+
+    async def _handle_route(self, route):
+        request = route.request
+        stats = self._stats_for(request)
+        if self.should_block(request.resource_type, request.url):
+            estimated = ESTIMATED_BYTES.get(request.resource_type, DEFAULT_ESTIMATED_BYTES)
+            stats["blocked"] += 1
+            stats["bytes_avoided"] += estimated
+            self.requests_blocked += 1
+            self.bytes_avoided += estimated
+            self.blocked_by_type[request.resource_type] = self.blocked_by_type.get(request.resource_type, 0) + 1
+            await route.abort()
+        else:
+            stats["allowed"] += 1
+            self.requests_allowed += 1
+            await route.continue_()
+
+    def finish_page(self, page, label=None):
+        stats = self._page_stats.pop(page, None)
+        if not stats or not self.verbose:
+            return stats
+        print(
+            f"  Blocked {stats['blocked']} of {stats['blocked'] + stats['allowed']} requests "
+            f"(~{stats['bytes_avoided'] / 1024:.0f} KB avoided) on {label or page.url}"
+        )
+        return stats
+
+    def print_report(self):
+        total = self.requests_allowed + self.requests_blocked
+        by_type = ", ".join(f"{kind}: {count}" for kind, count in sorted(self.blocked_by_type.items()))
+        print(
+            f"Resource filter: blocked {self.requests_blocked} of {total} requests, "
+            f"~{self.bytes_avoided / (1024 * 1024):.1f} MB avoided"
+            + (f" ({by_type})" if by_type else "")
+        )
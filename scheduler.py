@@ -0,0 +1,211 @@
+import asyncio
+import contextlib
+import time
+
+
+
+class WorkScheduler:
+    def __init__(self, concurrency, name="slot"):
+        self.concurrency = max(1, int(concurrency))
+        self.name = name
+        self.slot_busy = [0.0] * self.concurrency
+        self.slot_jobs = [0] * self.concurrency
+        self.started_at = None
+        self.finished_at = None
+
+    async def run(self, items, worker, on_result=None):
+        # Items may be a plain iterable or an async iterable that is still producing;
+        # the bounded queue keeps the producer at most a couple of items per slot ahead
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        self.started_at = time.monotonic()
+        try:
+            results = await asyncio.gather(
+                self._produce(items, queue),
+                *(self._run_slot(index, queue, worker, on_result) for index in range(self.concurrency)),
+                return_exceptions=True,
+            )
+        finally:
+            self.finished_at = time.monotonic()
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def _produce(self, items, queue):
+        try:
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    await queue.put((item,))
+            else:
+                for item in items:
+                    await queue.put((item,))
+        finally:
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+    async def _run_slot(self, index, queue, worker, on_result):
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                return
+            item = entry[0]
+            start = time.monotonic()
+            try:
+                result = await worker(item)
+            except Exception as e:
+                print(f"Error in {self.name} {index}: {e}")
+                continue
+            finally:
+                self.slot_busy[index] += time.monotonic() - start
+                self.slot_jobs[index] += 1
+            if on_result is not None:
+                on_result(item, result)
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    def utilization(self):
+        elapsed = self.elapsed()
+        if elapsed <= 0:
+            return [0.0] * self.concurrency
+        return [busy / elapsed for busy in self.slot_busy]
+
+    def print_report(self):
+        elapsed = self.elapsed()
+        utilization = self.utilization()
+        print(f"\n{self.name.capitalize()} utilization over {elapsed:.2f} seconds:")
+        for index, (busy, jobs, ratio) in enumerate(zip(self.slot_busy, self.slot_jobs, utilization)):
+            print(f"  {self.name} {index:>2}: {jobs:>4} jobs, busy {busy:8.2f}s ({ratio:6.1%})")
+        average = sum(utilization) / len(utilization) if utilization else 0.0
+        print(f"  average utilization: {average:.1%}")
+
+
+
+class ConcurrencyLimiter:
+    def __init__(self, limit, name="page"):
+        self.limit = max(1, int(limit))
+        self.name = name
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.acquisitions = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self._semaphore = asyncio.Semaphore(self.limit)
+        self._busy_area = 0.0
+        self._last_change = None
+        self._started_at = None
+
+    def _update_area(self):
+        now = time.monotonic()
+        if self._started_at is None:
+            self._started_at = now
+        if self._last_change is not None:
+            self._busy_area += self.in_use * (now - self._last_change)
+        self._last_change = now
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        start = time.monotonic()
+        if self._semaphore.locked():
+            self.waits += 1
+        await self._semaphore.acquire()
+        self.wait_time += time.monotonic() - start
+        self._update_area()
+        self.in_use += 1
+        self.acquisitions += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+        try:
+            yield
+        finally:
+            self._update_area()
+            self.in_use -= 1
+            self._semaphore.release()
+
+    def utilization(self):
+        if self._started_at is None:
+            return 0.0
+        self._update_area()
+        elapsed = self._last_change - self._started_at
+        if elapsed <= 0:
+            return 0.0
+        return self._busy_area / (self.limit * elapsed)
+
+    def print_report(self):
+        print(
+            f"{self.name.capitalize()} slots: limit {self.limit}, peak {self.peak_in_use}, "
+            f"{self.acquisitions} acquisitions, {self.waits} waited ({self.wait_time:.2f}s total), "
+            f"utilization {self.utilization():.1%}"
+        )
+
+
+
+class PipelineStage:
+    def __init__(self, name, worker, concurrency, queue_size=None):
+        self.name = name
+        self.worker = worker
+        self.concurrency = max(1, int(concurrency))
+        self.queue = asyncio.Queue(maxsize=queue_size or self.concurrency * 2)
+        self.processed = 0
+        self.errors = 0
+        self.peak_queue_depth = 0
+        self.busy_time = 0.0
+        self.started_at = None
+        self._workers = []
+
+    def start(self):
+        if self._workers:
+            return
+        self.started_at = time.monotonic()
+        self._workers = [asyncio.create_task(self._run_worker()) for _ in range(self.concurrency)]
+
+    async def submit(self, *args):
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((args, future))
+        self.peak_queue_depth = max(self.peak_queue_depth, self.queue.qsize())
+        return future
+
+    async def run(self, *args):
+        return await (await self.submit(*args))
+
+    async def _run_worker(self):
+        while True:
+            args, future = await self.queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                start = time.monotonic()
+                try:
+                    result = await self.worker(*args)
+                except Exception as e:
+                    self.errors += 1
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    if not future.cancelled():
+                        future.set_result(result)
+                finally:
+                    self.busy_time += time.monotonic() - start
+                    self.processed += 1
+            finally:
+                self.queue.task_done()
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def utilization(self):
+        if self.started_at is None:
+            return 0.0
+        elapsed = time.monotonic() - self.started_at
+        return self.busy_time / (self.concurrency * elapsed) if elapsed > 0 else 0.0
+
+    def print_report(self):
+        print(
+            f"{self.name.capitalize()} stage: {self.processed} processed, {self.errors} errors, "
+            f"{self.concurrency} workers at {self.utilization():.1%} utilization, peak queue depth {self.peak_queue_depth}"
+        )
@@ -0,0 +1,108 @@
+import asyncio
+import glob
+import hashlib
+import os
+import sqlite3
+import sys
+from storage import RESULTS_DB, RESULTS_JSON, SQLiteResultStore
+from frontier import CrawlFrontier
+
+
+
+SHARD_DB_PATTERN = "car_models.shard-*-of-*.sqlite3"
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+
+def parse_shard(value):
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{value}', expected INDEX/COUNT such as 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{value}', INDEX must be between 0 and COUNT - 1")
+    return index, count
+
+
+
+def shard_for(brand, count):
+    key = (brand.get("name_normalized") or brand["name"].upper()).encode("utf-8")
+    return int.from_bytes(hashlib.sha1(key).digest()[:8], "big") % count
+
+
+
+def shard_paths(index, count):
+    suffix = f"shard-{index}-of-{count}"
+    return f"car_models.{suffix}.sqlite3", f"car_models.{suffix}.json"
+
+
+
+async def run_workers(workers, brands_file, retry_failed=False, metrics_file=None, process_images=False):
+    processes = []
+    for index in range(workers):
+        command = [sys.executable, MAIN_SCRIPT, "--shard", f"{index}/{workers}", "--brands-file", brands_file, "--no-export"]
+        if retry_failed:
+            command.append("--retry-failed")
+        if metrics_file is not None:
+            command.extend(["--metrics-file", metrics_file])
+        if process_images:
+            command.append("--process-images")
+        print(f"Starting worker {index + 1} of {workers}")
+        processes.append(await asyncio.create_subprocess_exec(*command))
+    return_codes = await asyncio.gather(*(process.wait() for process in processes))
+    for index, return_code in enumerate(return_codes):
+        if return_code != 0:
+            print(f"Worker {index + 1} of {workers} (shard {index}/{workers}) exited with code {return_code}")
+    return [shard_paths(index, workers)[0] for index in range(workers)], all(code == 0 for code in return_codes)
+
+
+
+def merge_shards(shard_dbs=None, results_db=RESULTS_DB, results_json=RESULTS_JSON):
+    if shard_dbs is None:
+        shard_dbs = sorted(glob.glob(SHARD_DB_PATTERN))
+    store = SQLiteResultStore(results_db)
+    CrawlFrontier(results_db).close()
+    try:
+        for shard_db in shard_dbs:
+            if not os.path.exists(shard_db):
+                print(f"Skipping missing shard output {shard_db}")
+                continue
+            shard_store = SQLiteResultStore(shard_db)
+            try:
+                merged = 0
+                for result in shard_store.iter_brand_results():
+                    store.upsert_brand(result)
+                    merged += 1
+            finally:
+                shard_store.close()
+            merge_frontier(shard_db, results_db)
+            print(f"Merged {merged} brands from {shard_db}")
+        store.export_json(results_json)
+        counts = store.counts()
+        print(
+            f"Merged dataset has {counts['brands']} brands, {counts['models']} models and "
+            f"{counts['generations']} generations, exported to {results_json}"
+        )
+    finally:
+        store.close()
+    return results_json
+
+
+
+def merge_frontier(shard_db, results_db):
+    connection = sqlite3.connect(results_db, isolation_level=None)
+    try:
+        connection.execute("ATTACH DATABASE ? AS shard", (shard_db,))
+        has_frontier = connection.execute(
+            "SELECT 1 FROM shard.sqlite_master WHERE type = 'table' AND name = 'frontier'"
+        ).fetchone()
+        if has_frontier:
+            connection.execute("INSERT OR REPLACE INTO main.frontier SELECT * FROM shard.frontier")
+        connection.execute("DETACH DATABASE shard")
+    finally:
+        connection.close()
+
+
+
+if __name__ == "__main__":
+    merge_shards(sys.argv[1:] or None)
@@ -0,0 +1,295 @@
+import contextlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from json_stream import iter_json_array, write_json_stream
+
+
+
+RESULTS_DB = "car_models.sqlite3"
+RESULTS_JSON = "car_models.json"
+# Brand rows created by upsert_model before the brand page finished are not results yet
+COMPLETE_BRAND = "(models_count IS NOT NULL OR error IS NOT NULL)"
+
+
+
+class ResultStore:
+    def processed_brand_names(self):
+        raise NotImplementedError
+
+    def upsert_brand(self, result):
+        raise NotImplementedError
+
+    def iter_brand_results(self):
+        raise NotImplementedError
+
+    def brand_result_count(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def import_json(self, file_path=RESULTS_JSON):
+        # Brands are parsed and stored one at a time, so memory does not grow with the file
+        imported = 0
+        for result in iter_json_array(file_path, "brand_models"):
+            if "brand_name" in result:
+                self.upsert_brand(result)
+                imported += 1
+        return imported
+
+    def export_json(self, file_path=RESULTS_JSON):
+        header = {
+            "extraction_date": datetime.now().isoformat(),
+            "total_brands_processed": self.brand_result_count(),
+        }
+        write_json_stream(file_path, header, "brand_models", self.iter_brand_results())
+        return file_path
+
+
+
+class SQLiteResultStore(ResultStore):
+    def __init__(self, path=RESULTS_DB):
+        self.path = path
+        self.duplicates_skipped = 0
+        self._connection = sqlite3.connect(path, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA foreign_keys=ON")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS brands (
+                name TEXT PRIMARY KEY,
+                url TEXT,
+                error TEXT,
+                models_count INTEGER,
+                models_with_images INTEGER,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS models (
+                id INTEGER PRIMARY KEY,
+                brand_name TEXT NOT NULL REFERENCES brands(name) ON DELETE CASCADE,
+                url TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS models_brand_url ON models(brand_name, url);
+            CREATE TABLE IF NOT EXISTS generations (
+                id INTEGER PRIMARY KEY,
+                model_id INTEGER NOT NULL REFERENCES models(id) ON DELETE CASCADE,
+                url TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS generations_model_url ON generations(model_id, url);
+        """)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        self._connection.execute("BEGIN")
+        try:
+            yield self._connection
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def is_empty(self):
+        return self._connection.execute("SELECT 1 FROM brands LIMIT 1").fetchone() is None
+
+    def processed_brand_names(self):
+        return {row[0] for row in self._connection.execute(f"SELECT name FROM brands WHERE {COMPLETE_BRAND}")}
+
+    def brand_result_count(self):
+        return self._connection.execute(f"SELECT COUNT(*) FROM brands WHERE {COMPLETE_BRAND}").fetchone()[0]
+
+    def counts(self):
+        return {
+            table: self._connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("brands", "models", "generations")
+        }
+
+    def _upsert_brand_row(self, result):
+        self._connection.execute(
+            """
+            INSERT INTO brands (name, url, error, models_count, models_with_images, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                url = excluded.url,
+                error = excluded.error,
+                models_count = COALESCE(excluded.models_count, brands.models_count),
+                models_with_images = COALESCE(excluded.models_with_images, brands.models_with_images),
+                updated_at = excluded.updated_at
+            """,
+            (
+                result["brand_name"],
+                result.get("brand_url"),
+                result.get("error"),
+                result.get("models_count"),
+                result.get("models_with_images"),
+                time.time(),
+            ),
+        )
+
+    def _upsert_model(self, brand_name, model, position):
+        self._connection.execute(
+            """
+            INSERT INTO models (brand_name, url, position, data) VALUES (?, ?, ?, ?)
+            ON CONFLICT(brand_name, url) DO UPDATE SET position = excluded.position, data = excluded.data
+            """,
+            (brand_name, model["url"], position, json.dumps(_without_generations(model), ensure_ascii=False)),
+        )
+        model_id = self._connection.execute(
+            "SELECT id FROM models WHERE brand_name = ? AND url = ?", (brand_name, model["url"])
+        ).fetchone()[0]
+        if "generations" in model:
+            generation_ids = []
+            seen_urls = set()
+            for generation_position, generation in enumerate(model["generations"] or []):
+                url = generation.get("url")
+                if not url:
+                    continue
+                if url in seen_urls:
+                    self.duplicates_skipped += 1
+                    continue
+                seen_urls.add(url)
+                generation_ids.append(self._upsert_generation(model_id, generation, generation_position))
+            self._delete_missing("generations", "model_id", model_id, generation_ids)
+        return model_id
+
+    def _upsert_generation(self, model_id, generation, position):
+        self._connection.execute(
+            """
+            INSERT INTO generations (model_id, url, position, data) VALUES (?, ?, ?, ?)
+            ON CONFLICT(model_id, url) DO UPDATE SET position = excluded.position, data = excluded.data
+            """,
+            (model_id, generation["url"], position, json.dumps(generation, ensure_ascii=False)),
+        )
+        return self._connection.execute(
+            "SELECT id FROM generations WHERE model_id = ? AND url = ?", (model_id, generation["url"])
+        ).fetchone()[0]
+
+    def _delete_missing(self, table, parent_column, parent_value, keep_ids):
+        placeholders = ",".join("?" * len(keep_ids))
+        query = f"DELETE FROM {table} WHERE {parent_column} = ?"
+        if keep_ids:
+            query += f" AND id NOT IN ({placeholders})"
+        self._connection.execute(query, (parent_value, *keep_ids))
+
+    def upsert_model(self, brand_name, model, position=0):
+        if not model.get("url"):
+            return None
+        with self._transaction():
+            self._connection.execute(
+                "INSERT INTO brands (name, updated_at) VALUES (?, ?) ON CONFLICT(name) DO NOTHING",
+                (brand_name, time.time()),
+            )
+            return self._upsert_model(brand_name, model, position)
+
+    def upsert_brand(self, result):
+        brand_name = result["brand_name"]
+        with self._transaction():
+            self._upsert_brand_row(result)
+            if "car_models" not in result:
+                return
+            seen_urls = set()
+            model_ids = []
+            for position, model in enumerate(result["car_models"]):
+                url = model.get("url")
+                if not url:
+                    continue
+                if url in seen_urls:
+                    self.duplicates_skipped += 1
+                    continue
+                seen_urls.add(url)
+                model_ids.append(self._upsert_model(brand_name, model, position))
+            self._delete_missing("models", "brand_name", brand_name, model_ids)
+
+    def _generations_for(self, model_id):
+        return [
+            json.loads(row[0])
+            for row in self._connection.execute(
+                "SELECT data FROM generations WHERE model_id = ? ORDER BY position, id", (model_id,)
+            )
+        ]
+
+    def _models_for(self, brand_name):
+        car_models = []
+        rows = self._connection.execute(
+            "SELECT id, data FROM models WHERE brand_name = ? ORDER BY position, id", (brand_name,)
+        ).fetchall()
+        for model_id, data in rows:
+            model = json.loads(data)
+            if "generations" in model:
+                model["generations"] = self._generations_for(model_id)
+            car_models.append(model)
+        return car_models
+
+    def get_model(self, brand_name, url):
+        row = self._connection.execute(
+            "SELECT id, data FROM models WHERE brand_name = ? AND url = ?", (brand_name, url)
+        ).fetchone()
+        if row is None:
+            return None
+        model = json.loads(row[1])
+        if "generations" in model:
+            model["generations"] = self._generations_for(row[0])
+        return model
+
+    def iter_brand_results(self):
+        rows = self._connection.execute(
+            f"SELECT name, url, error, models_with_images FROM brands WHERE {COMPLETE_BRAND} ORDER BY rowid"
+        ).fetchall()
+        for name, url, error, models_with_images in rows:
+            if error:
+                yield {
+                    "brand_name": name,
+                    "brand_url": url,
+                    "error": error
+                }
+                continue
+            car_models = self._models_for(name)
+            yield {
+                "brand_name": name,
+                "brand_url": url,
+                "models_count": len(car_models),
+                "models_with_images": models_with_images or 0,
+                "car_models": car_models
+            }
+
+    def close(self):
+        self._connection.close()
+
+
+
+def _without_generations(model):
+    if "generations" not in model:
+        return model
+    # Generations live in their own table; the key is kept so exports preserve field order
+    data = dict(model)
+    data["generations"] = None
+    return data
+
+
+
+def open_result_store(path=RESULTS_DB, legacy_json=RESULTS_JSON):
+    store = SQLiteResultStore(path)
+    if store.is_empty() and legacy_json and os.path.exists(legacy_json):
+        try:
+            imported = store.import_json(legacy_json)
+            print(f"Imported {imported} brands from {legacy_json} into {path}")
+        except Exception as e:
+            print(f"Error importing existing {legacy_json}: {e}")
+    return store
+
+
+
+if __name__ == "__main__":
+    output = sys.argv[1] if len(sys.argv) > 1 else RESULTS_JSON
+    store = SQLiteResultStore(RESULTS_DB)
+    try:
+        print(f"Exported {store.export_json(output)}")
+    finally:
+        store.close()
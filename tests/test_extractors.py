@@ -0,0 +1,20 @@
+import os
+import pytest
+from extractors import FIXTURES, FIXTURES_DIR, load_golden, parse_brand_count
+
+pytest.importorskip("bs4")
+
+
+
+@pytest.mark.parametrize("filename, script, parse_html", FIXTURES, ids=[filename for filename, _, _ in FIXTURES])
+def test_static_parsers_match_expected_records(filename, script, parse_html):
+    # The expected records are the browser engine's output; refresh them with `python extractors.py --update-goldens`
+    with open(os.path.join(FIXTURES_DIR, filename), "r", encoding="utf-8") as f:
+        html = f.read()
+    assert parse_html(html) == load_golden(filename)
+
+
+
+def test_brand_count():
+    with open(os.path.join(FIXTURES_DIR, "brands.html"), "r", encoding="utf-8") as f:
+        assert parse_brand_count(f.read()) == 4
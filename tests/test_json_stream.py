@@ -0,0 +1,47 @@
+import json
+import pytest
+from json_stream import iter_json_array, write_json_stream
+
+
+
+def write_text(tmp_path, text):
+    path = tmp_path / "car_models.json"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+
+def test_write_matches_json_dump(tmp_path):
+    items = [{"brand_name": "Škoda \"S\"", "car_models": [{"name": "Octavia", "generations": []}]}, {"brand_name": "BMW"}]
+    fields = {"extraction_date": "2024-01-01T00:00:00", "total_brands_processed": len(items)}
+    path = str(tmp_path / "car_models.json")
+    assert write_json_stream(path, fields, "brand_models", iter(items)) == len(items)
+    with open(path, "r", encoding="utf-8") as f:
+        assert f.read() == json.dumps({**fields, "brand_models": items}, indent=2, ensure_ascii=False)
+    assert list(iter_json_array(path, "brand_models", chunk_size=3)) == items
+
+
+
+def test_empty_and_missing_arrays(tmp_path):
+    path = str(tmp_path / "car_models.json")
+    write_json_stream(path, {"total_brands_processed": 0}, "brand_models", [])
+    assert list(iter_json_array(path, "brand_models")) == []
+    assert list(iter_json_array(write_text(tmp_path, '{"other": [1, {"a": 2}]}'), "brand_models")) == []
+
+
+
+@pytest.mark.parametrize("number", ["12.75", "-1.5e3", "123456", "6.02E+23"])
+def test_numbers_split_at_every_chunk_boundary(tmp_path, number):
+    prefix = '{"extraction_date": "x", "brand_models": [{"n": '
+    text = prefix + number + '}, ' + number + ', 3]}'
+    path = write_text(tmp_path, text)
+    expected = [{"n": json.loads(number)}, json.loads(number), 3]
+    for chunk_size in range(1, len(text) + 1):
+        assert list(iter_json_array(path, "brand_models", chunk_size=chunk_size)) == expected, chunk_size
+
+
+
+def test_truncated_file_raises(tmp_path):
+    path = write_text(tmp_path, '{"brand_models": [1, 2,')
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(path, "brand_models", chunk_size=2))